@@ -1,5 +1,6 @@
 import os
-from flask import jsonify, current_app
+import click
+from flask import jsonify, request
 from flask_migrate import Migrate
 from config import create_app, db
 
@@ -11,7 +12,16 @@ migrate = Migrate(app, db)
 
 # Health check endpoint
 def health_check():
-    return jsonify({"status": "healthy", "message": "Server is running!"}), 200
+    from utils.encoding_pool import get_encoding_pool
+    from utils.enrollment_jobs import get_enrollment_runner
+    from utils.session_scheduler import get_session_scheduler
+    return jsonify({
+        "status": "healthy",
+        "message": "Server is running!",
+        "encoding_pool": get_encoding_pool().stats(),
+        "enrollment": get_enrollment_runner().stats(),
+        "session_status": get_session_scheduler().stats()
+    }), 200
 app.add_url_rule('/health', 'health_check', health_check, methods=['GET'])
 
 # Error handlers
@@ -26,7 +36,25 @@ def request_entity_too_large(error):
 # Serve uploaded files
 @app.route('/uploads/<path:filename>')
 def serve_uploaded(filename):
-    return current_app.send_static_file(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    from utils.image_variants import send_upload
+    return send_upload(filename, request.args.get('size'))
+
+# CLI: compute stored face encodings for users enrolled before they existed
+@app.cli.command("backfill-faces")
+@click.option("--org", "organization_id", type=int, default=None, help="Limit to one organization.")
+def backfill_faces(organization_id):
+    from utils.face_utils import backfill_face_encodings
+    written = backfill_face_encodings(organization_id)
+    click.echo(f"Stored {written} face encodings.")
+
+# CLI: recompute the materialized attendance counters and daily rollup
+@app.cli.command("repair-counters")
+@click.option("--org", "organization_id", type=int, default=None, help="Limit to one organization.")
+def repair_counters(organization_id):
+    from utils.attendance_counters import repair_counters as repair
+    sessions, users, days = repair(organization_id)
+    db.session.commit()
+    click.echo(f"Fixed {sessions} session and {users} user counters; rebuilt {days} daily rollup rows.")
 
 # Only run this if executed directly (i.e., development mode)
 if __name__ == "__main__":
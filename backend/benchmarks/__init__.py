@@ -0,0 +1,4 @@
+"""
+Offline benchmarks for the recognition hot path. Run from the backend
+directory, e.g. `python -m benchmarks.ann_benchmark`.
+"""
@@ -0,0 +1,73 @@
+"""
+Recall and latency of the IVF index against exact search on synthetic
+galleries.
+
+    python -m benchmarks.ann_benchmark
+    python -m benchmarks.ann_benchmark --sizes 10000 100000 --nlist 256 --nprobe 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.stats import percentiles, write_results
+from benchmarks.synthetic import synthetic_embeddings, synthetic_queries
+from utils.gallery import Gallery, IVFIndex, ann_params
+
+
+def _time_queries(gallery, queries, exact):
+    samples, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(gallery.match(q[None, :], exact=exact)[0])
+        samples.append((time.perf_counter() - start) * 1000)
+    return results, percentiles(samples)
+
+
+def run(sizes, nlists, nprobes, n_queries, seed):
+    rows = []
+    for size in sizes:
+        matrix, ids = synthetic_embeddings(size, seed)
+        queries = synthetic_queries(matrix, n_queries, seed + 1)
+        gallery = Gallery(matrix, ids)
+        truth, exact_lat = _time_queries(gallery, queries, exact=True)
+        rows.append({"size": size, "index": "exact", "recall@1": 1.0, "latency_ms": exact_lat})
+
+        default = ann_params(size)
+        for nlist in nlists or [default[0] if default else max(1, int(np.sqrt(size)))]:
+            start = time.perf_counter()
+            gallery.index = IVFIndex.build(gallery.matrix, nlist, 1, seed=seed)
+            build_s = time.perf_counter() - start
+            for nprobe in nprobes:
+                gallery.index.nprobe = min(nprobe, gallery.index.nlist)
+                found, lat = _time_queries(gallery, queries, exact=False)
+                recall = np.mean([f.top_k[0][0] == t.top_k[0][0] for f, t in zip(found, truth)])
+                rows.append({"size": size, "index": "ivf", "nlist": nlist, "nprobe": nprobe,
+                             "build_s": round(build_s, 3), "recall@1": float(recall), "latency_ms": lat})
+        gallery.index = None
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    ap.add_argument("--nlist", type=int, nargs="*", default=None,
+                    help="list counts to try (default: the ANN_TIERS value for each size)")
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32])
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write results to this file")
+    args = ap.parse_args()
+
+    rows = run(args.sizes, args.nlist, args.nprobe, args.queries, args.seed)
+    for r in rows:
+        lat = r["latency_ms"]
+        params = f"nlist={r['nlist']:<4} nprobe={r['nprobe']:<3}" if r["index"] == "ivf" else " " * 21
+        print(f"{r['size']:>7}  {r['index']:<5} {params} recall@1={r['recall@1']:.3f}  "
+              f"p50={lat['p50']:.3f}ms p95={lat['p95']:.3f}ms")
+    if args.json:
+        write_results(args.json, "ann", vars(args), rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+Query-plan regression check. Seeds a scratch database with a large
+synthetic dataset, calls every GET endpoint of the API as an org admin
+(plus the status scheduler and the attendance counter updates), and
+EXPLAINs each statement they issue. Exits non-zero when any of them reads
+a whole large table, so a new endpoint cannot quietly bring back a
+sequential scan.
+
+    DATABASE_URL=postgresql://localhost/attendance_plans python -m benchmarks.query_plans
+    DATABASE_URL=sqlite:////tmp/plans.sqlite python -m benchmarks.query_plans --orgs 5 --json plans.json
+
+Point DATABASE_URL at an empty scratch database: tables are created and
+filled there (--reuse skips seeding on a second run). The indexes come from
+running the migrations, and the run fails if they differ from the models. New GET routes are
+picked up automatically; give them query parameters in VARIANTS if their
+interesting path needs some.
+"""
+import argparse
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, insert
+
+from benchmarks.stats import write_results
+
+# Tables that grow with the organization; reading one of these in full is a regression
+LARGE_TABLES = ("attendance_record", "attendance_session", "user")
+# Streams, file serving and job polling have no reporting queries worth planning
+SKIP_BLUEPRINTS = {"recognize", "upload"}
+SKIP_ENDPOINTS = {"static", "health_check", "serve_uploaded", "metrics"}
+# Extra query strings per endpoint; each dict is one call
+VARIANTS = {
+    "user.search_user": [{"query": "u0-1"}],
+    "attendance.get_my_attendance_percentage": [{}, {"start": "{month_ago}", "end": "{today}"}],
+    "attendance.get_weekly_attendance": [{}, {"location": "Hall A"}],
+    "attendance.get_all_sessions": [{"page": 3}],
+}
+LOCATIONS = ("Hall A", "Hall B", None)
+CHUNK = 10_000
+
+
+def _chunks(rows, size=CHUNK):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def seed(db, orgs: int, users_per_org: int, sessions_per_org: int, attendance: float, rnd: random.Random):
+    from models import AttendanceRecord, AttendanceSession, AttendanceStatusEnum, Organization, User
+    from utils.attendance_counters import repair_counters
+
+    now = datetime.now(timezone.utc)
+    db.session.execute(insert(Organization), [{"id": o + 1, "name": f"org-{o}"} for o in range(orgs)])
+
+    users, members = [], {}
+    for o in range(orgs):
+        for i in range(users_per_org):
+            uid = o * users_per_org + i + 1
+            role = "admin" if i == 0 else "supervisor" if i == 1 else "user"
+            users.append({"id": uid, "user_id": f"u{o}-{i}", "name": f"User {o}-{i}", "email": f"u{o}-{i}@example.com",
+                          "password_hash": "x", "role": role, "organization_id": o + 1})
+            members.setdefault(o + 1, []).append(uid)
+    for rows in _chunks(users):
+        db.session.execute(insert(User), rows)
+
+    sessions, records = [], []
+    for o in range(orgs):
+        admin = members[o + 1][0]
+        for s in range(sessions_per_org):
+            sid = o * sessions_per_org + s + 1
+            # a year of history plus a few upcoming sessions
+            start = now - timedelta(days=365 * (1 - s / sessions_per_org), hours=rnd.random() * 8) + timedelta(days=7)
+            ends = start + timedelta(minutes=60)
+            status = (AttendanceStatusEnum.SCHEDULED if start > now else
+                      AttendanceStatusEnum.ACTIVE if ends > now else AttendanceStatusEnum.COMPLETED)
+            sessions.append({"id": sid, "title": f"Session {s}", "location": rnd.choice(LOCATIONS),
+                             "date": start.date(), "start_time": start, "duration_minutes": 60, "ends_at": ends,
+                             "status": status, "organization_id": o + 1, "creator_id": admin})
+            if status is AttendanceStatusEnum.SCHEDULED:
+                continue
+            for uid in rnd.sample(members[o + 1], int(users_per_org * attendance)):
+                records.append({"session_id": sid, "user_id": uid,
+                                "timestamp": start + timedelta(minutes=rnd.random() * 60)})
+    for rows in _chunks(sessions):
+        db.session.execute(insert(AttendanceSession), rows)
+    for rows in _chunks(records):
+        db.session.execute(insert(AttendanceRecord), rows)
+    repair_counters()
+    db.session.commit()
+
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    return len(users), len(sessions), len(records)
+
+
+# The last migration before the index migration the plans rely on
+PRE_INDEX_REVISION = "c3f58a0d6e21"
+INDEX_REVISION = "d9a4b3e17f56"
+
+
+def build_schema(app, db):
+    """
+    Create the scratch schema the way a deployment gets it. The base tables
+    predate the migrations, so they come from the models, minus the indexes
+    the index migration adds; the database is then stamped just before that
+    migration and upgraded to head, so those indexes are built by it.
+    """
+    from alembic.script import ScriptDirectory
+    from flask_migrate import stamp, upgrade
+    from sqlalchemy import inspect
+
+    with app.app_context():
+        if inspect(db.engine).has_table("alembic_version"):
+            upgrade()
+            return
+        db.create_all()
+        script = ScriptDirectory.from_config(app.extensions["migrate"].migrate.get_config())
+        with db.engine.begin() as conn:
+            for name, table, _ in script.get_revision(INDEX_REVISION).module.INDEXES:
+                conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+        stamp(revision=PRE_INDEX_REVISION)
+        upgrade()
+
+
+def index_drift(db) -> list[str]:
+    """Differences between the indexes the models declare and the ones the migrations built."""
+    from sqlalchemy import inspect
+
+    inspector = inspect(db.engine)
+    drift = []
+    for table in db.metadata.sorted_tables:
+        declared = {ix.name: [c.name for c in ix.columns] for ix in table.indexes}
+        # indexes backing unique constraints are not declared as Index
+        built = {ix["name"]: ix["column_names"] for ix in inspector.get_indexes(table.name)
+                 if ix["name"] and not ix.get("duplicates_constraint") and not ix["name"].startswith("sqlite_")}
+        for name in sorted(declared.keys() | built.keys()):
+            if declared.get(name) != built.get(name):
+                drift.append(f"{table.name}.{name}: models {declared.get(name)}, database {built.get(name)}")
+    return drift
+
+
+class StatementLog:
+    """Statements issued on this thread while active (other threads, e.g. the scheduler, are ignored)."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements: list[tuple[str, object]] = []
+        self._thread = None
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == self._thread and not executemany \
+                and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE", "WITH", "INSERT"):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        self._thread = threading.get_ident()
+        event.listen(self.engine, "before_cursor_execute", self._before)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._before)
+
+
+_SQLITE_SCAN = re.compile(r"^SCAN (\S+)(?: AS \S+)?$")
+_SQLITE_ROWID_ORDER = re.compile(r"ORDER BY (\"?\w+\"?)\.id\b")
+
+
+def _sqlite_scans(cursor, statement: str, parameters) -> list[str]:
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    found = []
+    for row in cursor.fetchall():
+        m = _SQLITE_SCAN.match(row[-1])
+        if m and m.group(1).strip('"') in LARGE_TABLES:
+            found.append(m.group(1).strip('"'))
+    return found
+
+
+def full_scans(engine, statement: str, parameters) -> list[str]:
+    """Large tables the plan of `statement` reads in full."""
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if engine.dialect.name == "postgresql":
+            cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                import json
+                plan = json.loads(plan)
+            found, stack = [], [plan[0]["Plan"]]
+            while stack:
+                node = stack.pop()
+                if node.get("Node Type") == "Seq Scan" and node.get("Relation Name") in LARGE_TABLES:
+                    found.append(node["Relation Name"])
+                stack.extend(node.get("Plans", []))
+            return found
+        if engine.dialect.name == "sqlite":
+            found = _sqlite_scans(cursor, statement, parameters)
+            if found:
+                # ORDER BY <table>.id can make SQLite walk the table in rowid
+                # order to skip a sort. Plan it again sorting in memory (the
+                # unary + hides the rowid order): if an index then serves the
+                # filter, the scan only saved a small sort and is not reported.
+                sorted_in_memory = _SQLITE_ROWID_ORDER.sub(r"ORDER BY +\1.id", statement)
+                if sorted_in_memory != statement:
+                    found = _sqlite_scans(cursor, sorted_in_memory, parameters)
+            return found
+        raise SystemExit(f"No EXPLAIN support for {engine.dialect.name}")
+    finally:
+        raw.rollback()
+        raw.close()
+
+
+def _path_values(org_id: int, db) -> dict:
+    from models import AttendanceSession, User
+    member = User.query.filter_by(organization_id=org_id, role="user").order_by(User.id).first()
+    session = AttendanceSession.query.filter_by(organization_id=org_id) \
+        .order_by(AttendanceSession.start_time.desc()).offset(10).first()
+    return {"int:user_id": member.id, "int:id": member.id, "user_id": member.user_id, "id": member.id,
+            "int:session_id": session.id, "session_id": session.id}
+
+
+def _route_cases(app, values: dict):
+    """(name, url, query string) for every plannable GET route."""
+    today = datetime.now(timezone.utc).date()
+    fill = {"today": today.isoformat(), "month_ago": (today - timedelta(days=30)).isoformat()}
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if "GET" not in rule.methods or rule.endpoint in SKIP_ENDPOINTS \
+                or rule.endpoint.split(".", 1)[0] in SKIP_BLUEPRINTS:
+            continue
+        url_values = {}
+        for arg in rule.arguments:
+            converter = type(rule._converters[arg]).__name__
+            key = f"int:{arg}" if converter == "IntegerConverter" else arg
+            if key not in values:
+                print(f"skipping {rule.rule}: no value for <{arg}>")
+                break
+            url_values[arg] = values[key]
+        else:
+            url = rule.build(url_values, append_unknown=False)[1]
+            for query in VARIANTS.get(rule.endpoint, [{}]):
+                query = {k: str(v).format(**fill) for k, v in query.items()}
+                name = rule.endpoint + (f" {query}" if query else "")
+                yield name, url, query
+
+
+def check(app, db, org_id: int):
+    from flask_jwt_extended import create_access_token
+    from models import AttendanceSession, User
+    from utils.attendance_counters import count_attendance
+
+    with app.app_context():
+        admin = User.query.filter_by(organization_id=org_id, role="admin").first()
+        token = create_access_token(identity=str(admin.id))
+        values = _path_values(org_id, db)
+        cases = list(_route_cases(app, values))
+        engine = db.engine
+    headers = {"Authorization": f"Bearer {token}"}
+    client = app.test_client()
+    log = StatementLog(engine)
+    results = []
+
+    def run(name, fn):
+        started = time.perf_counter()
+        with log:
+            status = fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        scans = []
+        for statement, parameters in log.statements:
+            for table in full_scans(engine, statement, parameters):
+                scans.append({"table": table, "sql": " ".join(statement.split())})
+        results.append({"case": name, "status": status, "statements": len(log.statements),
+                        "ms": round(elapsed, 1), "full_scans": scans})
+
+    for name, url, query in cases:
+        run(name, lambda: client.get(url, query_string=query, headers=headers).status_code)
+
+    def scheduler():
+        with app.app_context():
+            AttendanceSession.bulk_update_statuses()
+            AttendanceSession.next_status_change()
+        return None
+
+    def counters():
+        # what one attendance writer flush adds on top of its INSERT
+        with app.app_context():
+            count_attendance([(values["session_id"], values["id"])])
+            db.session.rollback()
+        return None
+
+    run("session status scheduler", scheduler)
+    run("attendance counters", counters)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--orgs", type=int, default=20)
+    ap.add_argument("--users", type=int, default=250, help="users per organization")
+    ap.add_argument("--sessions", type=int, default=300, help="sessions per organization")
+    ap.add_argument("--attendance", type=float, default=0.5, help="fraction of users at each held session")
+    ap.add_argument("--reuse", action="store_true", help="plan against data seeded by an earlier run")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write machine-readable results to this file")
+    args = ap.parse_args()
+
+    from flask_migrate import Migrate
+    from config import create_app, db
+    from models import User
+    app = create_app()
+    Migrate(app, db)
+    build_schema(app, db)
+    with app.app_context():
+        drift = index_drift(db)
+        if drift:
+            raise SystemExit("Model indexes differ from the migrations:\n  " + "\n  ".join(drift))
+        seeded = User.query.first() is not None
+        if seeded and not args.reuse:
+            raise SystemExit("Database already has users; point DATABASE_URL at a scratch database or pass --reuse")
+        if not seeded:
+            started = time.perf_counter()
+            counts = seed(db, args.orgs, args.users, args.sessions, args.attendance, random.Random(args.seed))
+            print(f"Seeded {counts[0]} users, {counts[1]} sessions, {counts[2]} records "
+                  f"in {time.perf_counter() - started:.1f}s")
+        org_id = max(1, (db.session.query(db.func.max(User.organization_id)).scalar() or 1) // 2)
+
+    results = check(app, db, org_id)
+    # a request that errored out never issued the rest of its queries
+    failures = [r for r in results if r["full_scans"] or (r["status"] or 0) >= 500]
+    for r in results:
+        mark = "FAIL" if r in failures else "ok"
+        print(f"{mark:<4} {r['case']:<60} status={r['status']} queries={r['statements']:<3} {r['ms']:8.1f}ms")
+        for scan in r["full_scans"]:
+            print(f"       full scan of {scan['table']}: {scan['sql'][:200]}")
+    print(f"{len(results)} cases, {len(failures)} failed (server errors or full scans of {', '.join(LARGE_TABLES)})")
+    if args.json:
+        write_results(args.json, "query_plans", vars(args), results)
+    raise SystemExit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Latency percentiles for each stage of the recognition hot path on a
+synthetic gallery, replaying recorded video (or synthetic frames) in place
+of a camera.
+
+    python -m benchmarks.recognition_benchmark --gallery-size 8000
+    python -m benchmarks.recognition_benchmark --video door.mp4 --frames 500 --json results.json
+
+Stages: gallery_load (stored bytes -> Gallery, as a cold rebuild does),
+gallery_map (memory-mapping a published gallery, as other workers do),
+detect, encode, match, draw, jpeg. detect/encode need face_recognition;
+without it they are reported as skipped and match runs on synthetic queries.
+"""
+import argparse
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.stats import StageTimer, print_summary, write_results
+from benchmarks.synthetic import synthetic_embeddings, synthetic_frames, synthetic_queries
+from utils.gallery import Gallery, encoding_to_bytes
+from utils.gallery_store import GalleryStore
+from utils.stream_pipeline import draw_labels
+from utils.video_source import open_video_source, PACE_MAX
+
+try:
+    import face_recognition
+except ImportError:  # dlib not built on this machine
+    face_recognition = None
+
+
+def replay_frames(spec: str, n: int):
+    """Up to n frames from a video source (file, image directory, ...), looping it if it is shorter."""
+    cap = open_video_source(spec, pace=PACE_MAX, loop=True)
+    if not cap.isOpened():
+        raise SystemExit(f"Cannot open video {spec}")
+    frames = []
+    try:
+        while len(frames) < n:
+            ok, frame = cap.read()
+            if not ok:
+                raise SystemExit(f"No frames in {spec}")
+            frames.append(frame)
+    finally:
+        cap.release()
+    return frames
+
+
+def bench_gallery_load(timer: StageTimer, size: int, repeats: int, seed: int) -> Gallery:
+    matrix, ids = synthetic_embeddings(size, seed)
+    rows = [(int(uid), 0, encoding_to_bytes(vec)) for uid, vec in zip(ids, matrix)]
+    gallery = None
+    for _ in range(repeats):
+        with timer.time("gallery_load"):
+            gallery = Gallery.from_rows(rows)
+
+    # what every other worker pays once a gallery has been published
+    with tempfile.TemporaryDirectory() as root:
+        store = GalleryStore(root)
+        published = store.publish(0, gallery)
+        for _ in range(repeats):
+            with timer.time("gallery_map"):
+                store.load(0, published)
+    return gallery
+
+
+def bench_frames(timer: StageTimer, gallery: Gallery, frames, detect_width: int,
+                 faces_per_frame: int, quality: int, seed: int):
+    queries = synthetic_queries(gallery.matrix, len(frames) * faces_per_frame, seed + 1)
+    for i, frame in enumerate(frames):
+        h, w = frame.shape[:2]
+        size = (detect_width, round(h * detect_width / w))
+        rgb_small = cv2.cvtColor(cv2.resize(frame, size), cv2.COLOR_BGR2RGB)
+
+        encs = []
+        if face_recognition is not None:
+            with timer.time("detect"):
+                locs = face_recognition.face_locations(rgb_small)
+            if locs:
+                with timer.time("encode"):
+                    encs = face_recognition.face_encodings(rgb_small, locs)
+        if not encs:
+            # no real faces: match synthetic probes so the stage is still measured
+            encs = queries[i * faces_per_frame:(i + 1) * faces_per_frame]
+
+        with timer.time("match"):
+            matches = gallery.match(encs)
+
+        boxes = [(h // 4, w // 4 + 80 * j + 60, h // 4 + 60, w // 4 + 80 * j) for j in range(len(matches))]
+        names = [str(m.user_id) if m.user_id is not None else "Unknown" for m in matches]
+        with timer.time("draw"):
+            annotated = draw_labels(frame.copy(), boxes, names)
+        with timer.time("jpeg"):
+            cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--gallery-size", type=int, default=8000)
+    ap.add_argument("--gallery-repeats", type=int, default=5)
+    ap.add_argument("--video", help="video file, image directory or other video source spec to replay instead of synthetic frames")
+    ap.add_argument("--frames", type=int, default=300)
+    ap.add_argument("--faces-per-frame", type=int, default=3,
+                    help="synthetic probes matched per frame when no real faces are found")
+    ap.add_argument("--detect-width", type=int, default=320)
+    ap.add_argument("--quality", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", help="write machine-readable results to this file")
+    args = ap.parse_args()
+
+    timer = StageTimer()
+    started = time.perf_counter()
+    gallery = bench_gallery_load(timer, args.gallery_size, args.gallery_repeats, args.seed)
+    frames = replay_frames(args.video, args.frames) if args.video else \
+        list(synthetic_frames(args.frames, seed=args.seed))
+    bench_frames(timer, gallery, frames, args.detect_width, args.faces_per_frame, args.quality, args.seed)
+    elapsed = time.perf_counter() - started
+
+    summary = timer.summary()
+    if face_recognition is None:
+        summary["detect"] = summary["encode"] = {"count": 0, "skipped": "face_recognition not installed"}
+    print_summary(summary)
+    print(f"{len(frames)} frames in {elapsed:.2f}s")
+    if args.json:
+        write_results(args.json, "recognition", vars(args),
+                      {"stages": summary, "frames": len(frames), "elapsed_s": elapsed})
+
+
+if __name__ == "__main__":
+    main()
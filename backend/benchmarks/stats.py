@@ -0,0 +1,74 @@
+import json
+import platform
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+def percentiles(samples_ms) -> dict:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if not len(arr):
+        return {"count": 0}
+    return {
+        "count": int(len(arr)),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+        # items per second if run back to back
+        "throughput": float(1000.0 / arr.mean()) if arr.mean() > 0 else None,
+    }
+
+
+class StageTimer:
+    """Collects wall-clock samples (ms) per named stage."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000)
+
+    def summary(self) -> dict:
+        return {stage: percentiles(s) for stage, s in self.samples.items()}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, benchmark: str, params: dict, results):
+    """Machine-readable results, tagged with commit and host so runs can be compared."""
+    doc = {
+        "benchmark": benchmark,
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "host": {"python": platform.python_version(), "machine": platform.machine(),
+                 "processor": platform.processor(), "numpy": np.__version__},
+        "params": params,
+        "results": results,
+    }
+    with open(path, "w") as fh:
+        json.dump(doc, fh, indent=2)
+
+
+def print_summary(summary: dict):
+    for stage, s in summary.items():
+        if not s.get("count"):
+            print(f"{stage:<14} (no samples)")
+            continue
+        print(f"{stage:<14} n={s['count']:<6} mean={s['mean']:8.3f}ms p50={s['p50']:8.3f}ms "
+              f"p95={s['p95']:8.3f}ms p99={s['p99']:8.3f}ms")
@@ -0,0 +1,55 @@
+import numpy as np
+
+from utils.gallery import EMBEDDING_DIM
+
+# Rough shape of dlib embeddings: vectors of norm ~1, same-person distances
+# around 0.3-0.4 and different-person distances around 0.8-1.0. People are
+# drawn around a few hundred population modes so the data is clustered the
+# way real galleries are; uniform noise would be a pessimistic worst case.
+POPULATION_MODES = 256
+MODE_SPREAD = 0.6
+PERSON_NOISE = 0.3
+
+
+def _scaled_normal(rng, shape, scale):
+    return rng.standard_normal(shape).astype(np.float32) * (scale / np.sqrt(EMBEDDING_DIM))
+
+
+def synthetic_embeddings(n: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """(matrix, ids) for a gallery of n people with one embedding each."""
+    rng = np.random.default_rng(seed)
+    modes = _scaled_normal(rng, (POPULATION_MODES, EMBEDDING_DIM), 1.0)
+    people = modes[rng.integers(0, POPULATION_MODES, n)] + _scaled_normal(rng, (n, EMBEDDING_DIM), MODE_SPREAD)
+    return people, np.arange(1, n + 1, dtype=np.int64)
+
+
+def synthetic_queries(matrix: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """New "photos" of n random enrolled people."""
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(matrix), n)
+    return matrix[rows] + _scaled_normal(rng, (n, EMBEDDING_DIM), PERSON_NOISE)
+
+
+def synthetic_frames(n: int, size=(640, 480), faces_per_frame: int = 3, seed: int = 0):
+    """
+    Stand-in camera frames: a noisy background with face-like blobs drifting
+    across it. HOG will rarely fire on these; use --video with a real
+    recording to measure detection and encoding on actual faces.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    w, h = size
+    background = rng.integers(40, 90, (h, w, 3), dtype=np.uint8)
+    starts = rng.uniform(0.1, 0.9, (faces_per_frame, 2))
+    for i in range(n):
+        frame = background.copy()
+        for fx, fy in starts:
+            cx = int(((fx + i * 0.003) % 0.8 + 0.1) * w)
+            cy = int(fy * h)
+            r = h // 10
+            cv2.ellipse(frame, (cx, cy), (r, int(r * 1.3)), 0, 0, 360, (150, 170, 200), -1)
+            cv2.circle(frame, (cx - r // 3, cy - r // 4), r // 8, (40, 40, 40), -1)
+            cv2.circle(frame, (cx + r // 3, cy - r // 4), r // 8, (40, 40, 40), -1)
+            cv2.ellipse(frame, (cx, cy + r // 2), (r // 3, r // 8), 0, 0, 180, (60, 60, 120), -1)
+        yield frame
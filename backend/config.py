@@ -35,6 +35,51 @@ class Config:
     UPLOAD_FOLDER = str(UPLOAD_FOLDER)
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 
+    # Published org galleries, memory-mapped by every worker process
+    GALLERY_DIR = os.getenv("GALLERY_DIR", str(BASE_DIR / "galleries"))
+
+    # Face encoding worker processes per app process (so per gunicorn worker);
+    # each holds its own copy of the dlib models
+    ENCODING_WORKERS = int(os.getenv("ENCODING_WORKERS", 2))
+
+    # Background enrollment: jobs claimed per batch, and how often other
+    # processes' queued jobs are polled for (seconds)
+    ENROLLMENT_BATCH_SIZE = int(os.getenv("ENROLLMENT_BATCH_SIZE", os.cpu_count() or 4))
+    ENROLLMENT_POLL_INTERVAL = float(os.getenv("ENROLLMENT_POLL_INTERVAL", 5.0))
+
+    # Write-behind batching of attendance produced by recognition
+    ATTENDANCE_FLUSH_SIZE = int(os.getenv("ATTENDANCE_FLUSH_SIZE", 50))
+    ATTENDANCE_FLUSH_INTERVAL = float(os.getenv("ATTENDANCE_FLUSH_INTERVAL", 1.0))
+
+    # Per-frame time target for the adaptive detection scale (ms)
+    DETECT_BUDGET_MS = float(os.getenv("DETECT_BUDGET_MS", 80))
+
+    # Motion gate in front of detection: share of a 64x48 thumbnail that must
+    # change, and the forced-detection interval on static scenes (seconds)
+    MOTION_MIN_FRACTION = float(os.getenv("MOTION_MIN_FRACTION", 0.01))
+    MOTION_FORCE_SECONDS = float(os.getenv("MOTION_FORCE_SECONDS", 5.0))
+
+    # Per-viewer MJPEG output limits under backpressure
+    STREAM_MIN_QUALITY = int(os.getenv("STREAM_MIN_QUALITY", 20))
+    STREAM_MIN_SCALE = float(os.getenv("STREAM_MIN_SCALE", 0.5))
+    STREAM_MAX_FRAME_STRIDE = int(os.getenv("STREAM_MAX_FRAME_STRIDE", 4))
+    STREAM_TARGET_FPS = float(os.getenv("STREAM_TARGET_FPS", 15))
+
+    # Default frame source for recognition ("0", "rtsp://...", or a recording
+    # under VIDEO_REPLAY_DIR), and where recordings may be replayed from
+    VIDEO_SOURCE = os.getenv("VIDEO_SOURCE", "0")
+    # Named cameras requests may pick with ?source=<name>, e.g.
+    # "door=rtsp://10.0.0.5/stream,lobby=1"; the only network streams allowed
+    VIDEO_CAMERAS = {
+        name.strip(): spec.strip()
+        for name, _, spec in (item.partition("=") for item in os.getenv("VIDEO_CAMERAS", "").split(","))
+        if name.strip() and spec.strip()
+    }
+    VIDEO_REPLAY_DIR = os.getenv("VIDEO_REPLAY_DIR", str(BASE_DIR / "replays"))
+
+    # POST /recognize/<session_id>/frames
+    RECOGNIZE_MAX_FRAMES = int(os.getenv("RECOGNIZE_MAX_FRAMES", 16))
+
     # JWT
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
     JWT_TOKEN_LOCATION = ["headers"]
@@ -58,6 +103,30 @@ def create_app():
         "supports_credentials": True
     }})
 
+    # Long-lived face encoding workers (started by gunicorn.conf.py or on first use)
+    from utils.encoding_pool import init_encoding_pool
+    init_encoding_pool(app)
+
+    # Batched attendance inserts from the recognition routes
+    from utils.attendance_writer import init_attendance_writer
+    init_attendance_writer(app)
+
+    # Versioned on-disk galleries shared by all workers
+    from utils.gallery_store import init_gallery_store
+    init_gallery_store(app)
+
+    # Background face enrollment jobs queued by uploads, registration and edits
+    from utils.enrollment_jobs import init_enrollment_runner
+    init_enrollment_runner(app)
+
+    # Session status transitions at each session's start and end time
+    from utils.session_scheduler import init_session_scheduler
+    init_session_scheduler(app)
+
+    # Per-stage and per-blueprint latency at /metrics
+    from utils.metrics import init_metrics
+    init_metrics(app)
+
     # Register blueprints (all routes)
     from routes.user_routes import user_bp
     from routes.auth_routes import auth_bp
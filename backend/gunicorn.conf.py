@@ -0,0 +1,26 @@
+# Picked up automatically by `gunicorn app:app` from the working directory.
+
+
+def post_worker_init(worker):
+    # Spawn and warm the encoding workers before this worker takes traffic,
+    # then pick up enrollment jobs left queued by earlier workers and bring
+    # session statuses up to date.
+    from utils.encoding_pool import get_encoding_pool
+    from utils.enrollment_jobs import get_enrollment_runner
+    from utils.session_scheduler import get_session_scheduler
+    get_encoding_pool().start()
+    get_enrollment_runner().start()
+    get_session_scheduler().start()
+
+
+def worker_exit(server, worker):
+    from utils.encoding_pool import get_encoding_pool
+    from utils.attendance_writer import get_attendance_writer
+    from utils.enrollment_jobs import get_enrollment_runner
+    from utils.gallery_store import get_gallery_store
+    from utils.session_scheduler import get_session_scheduler
+    get_session_scheduler().shutdown()
+    get_enrollment_runner().shutdown()
+    get_gallery_store().shutdown()
+    get_attendance_writer().shutdown()
+    get_encoding_pool().shutdown(wait=False)
@@ -0,0 +1,41 @@
+"""Add face_encoding table for stored enrollment encodings
+
+Revision ID: 3b7f2c9d41a6
+Revises: e6549a281e74
+Create Date: 2025-05-06 10:42:18.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f2c9d41a6'
+down_revision = 'e6549a281e74'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'face_encoding',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('model_version', sa.String(length=50), nullable=False),
+        sa.Column('encoding', sa.LargeBinary(), nullable=False),
+        sa.Column('source_image', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_id', 'model_version', name='unique_user_face_encoding')
+    )
+    with op.batch_alter_table('face_encoding', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_face_encoding_user_id'), ['user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('face_encoding', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_face_encoding_user_id'))
+
+    op.drop_table('face_encoding')
@@ -0,0 +1,45 @@
+"""Add enrollment_job table for background face enrollment
+
+Revision ID: 8c41d2e7a9f3
+Revises: 3b7f2c9d41a6
+Create Date: 2025-05-09 14:12:51.730452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e7a9f3'
+down_revision = '3b7f2c9d41a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'enrollment_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('image_url', sa.String(length=255), nullable=False),
+        sa.Column('status', sa.Enum('QUEUED', 'PROCESSING', 'DONE', 'FAILED', name='enrollmentstatusenum'), nullable=False),
+        sa.Column('stage', sa.String(length=20), nullable=False),
+        sa.Column('error', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('enrollment_job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_enrollment_job_user_id'), ['user_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_enrollment_job_status'), ['status'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment_job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_enrollment_job_status'))
+        batch_op.drop_index(batch_op.f('ix_enrollment_job_user_id'))
+
+    op.drop_table('enrollment_job')
+    sa.Enum(name='enrollmentstatusenum').drop(op.get_bind(), checkfirst=True)
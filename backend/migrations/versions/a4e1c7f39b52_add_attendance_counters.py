@@ -0,0 +1,41 @@
+"""Add materialized attendee_count and sessions_attended counters
+
+Revision ID: a4e1c7f39b52
+Revises: d5a93f1b7c20
+Create Date: 2025-05-14 10:22:43.905117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e1c7f39b52'
+down_revision = 'd5a93f1b7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('attendance_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('attendee_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sessions_attended', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE attendance_session SET attendee_count = "
+        "(SELECT count(*) FROM attendance_record r WHERE r.session_id = attendance_session.id)"
+    )
+    op.execute(
+        'UPDATE "user" SET sessions_attended = '
+        '(SELECT count(*) FROM attendance_record r WHERE r.user_id = "user".id)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('sessions_attended')
+
+    with op.batch_alter_table('attendance_session', schema=None) as batch_op:
+        batch_op.drop_column('attendee_count')
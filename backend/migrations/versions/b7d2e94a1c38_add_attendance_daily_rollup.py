@@ -0,0 +1,43 @@
+"""Add attendance_daily rollup table
+
+Revision ID: b7d2e94a1c38
+Revises: a4e1c7f39b52
+Create Date: 2025-05-15 16:04:19.362840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e94a1c38'
+down_revision = 'a4e1c7f39b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'attendance_daily',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('organization_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('location', sa.String(length=255), server_default='', nullable=False),
+        sa.Column('sessions', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('records', sa.Integer(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['organization_id'], ['organization.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('organization_id', 'day', 'location', name='unique_attendance_daily')
+    )
+
+    # attendee_count is already backfilled by the previous revision
+    op.execute(
+        "INSERT INTO attendance_daily (organization_id, day, location, sessions, records) "
+        "SELECT organization_id, date, coalesce(location, ''), count(id), sum(attendee_count) "
+        "FROM attendance_session WHERE date IS NOT NULL "
+        "GROUP BY organization_id, date, coalesce(location, '')"
+    )
+
+
+def downgrade():
+    op.drop_table('attendance_daily')
@@ -0,0 +1,36 @@
+"""Add ends_at to attendance_session for the status scheduler
+
+Revision ID: c3f58a0d6e21
+Revises: b7d2e94a1c38
+Create Date: 2025-05-17 11:48:02.174593
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f58a0d6e21'
+down_revision = 'b7d2e94a1c38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('attendance_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ends_at', sa.DateTime(timezone=True), nullable=True))
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE attendance_session SET ends_at = "
+                   "datetime(start_time, '+' || duration_minutes || ' minutes')")
+    else:
+        op.execute("UPDATE attendance_session SET ends_at = "
+                   "start_time + duration_minutes * interval '1 minute'")
+
+    with op.batch_alter_table('attendance_session', schema=None) as batch_op:
+        batch_op.alter_column('ends_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('attendance_session', schema=None) as batch_op:
+        batch_op.drop_column('ends_at')
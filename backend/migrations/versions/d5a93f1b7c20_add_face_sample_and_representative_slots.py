@@ -0,0 +1,64 @@
+"""Add face_sample table and representative slots on face_encoding
+
+Revision ID: d5a93f1b7c20
+Revises: 8c41d2e7a9f3
+Create Date: 2025-05-12 09:31:07.518264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5a93f1b7c20'
+down_revision = '8c41d2e7a9f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'face_sample',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('image_url', sa.String(length=255), nullable=True),
+        sa.Column('is_primary', sa.Boolean(), server_default=sa.false(), nullable=False),
+        sa.Column('model_version', sa.String(length=50), nullable=False),
+        sa.Column('encoding', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('face_sample', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_face_sample_user_id'), ['user_id'], unique=False)
+
+    # every existing single-photo encoding becomes that user's primary sample
+    op.execute(
+        "INSERT INTO face_sample (user_id, image_url, is_primary, model_version, encoding, created_at) "
+        "SELECT user_id, source_image, true, model_version, encoding, created_at FROM face_encoding"
+    )
+
+    with op.batch_alter_table('face_encoding', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slot', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_constraint('unique_user_face_encoding', type_='unique')
+        batch_op.create_unique_constraint('unique_user_face_encoding_slot', ['user_id', 'model_version', 'slot'])
+
+    with op.batch_alter_table('enrollment_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('kind', sa.String(length=10), server_default='profile', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('enrollment_job', schema=None) as batch_op:
+        batch_op.drop_column('kind')
+
+    # keep only the first representative so the old one-row-per-user constraint holds
+    op.execute("DELETE FROM face_encoding WHERE slot <> 0")
+    with op.batch_alter_table('face_encoding', schema=None) as batch_op:
+        batch_op.drop_constraint('unique_user_face_encoding_slot', type_='unique')
+        batch_op.create_unique_constraint('unique_user_face_encoding', ['user_id', 'model_version'])
+        batch_op.drop_column('slot')
+
+    with op.batch_alter_table('face_sample', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_face_sample_user_id'))
+
+    op.drop_table('face_sample')
@@ -0,0 +1,41 @@
+"""Add indexes for the attendance, session and user access paths
+
+Revision ID: d9a4b3e17f56
+Revises: c3f58a0d6e21
+Create Date: 2025-05-19 09:12:37.640218
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b3e17f56'
+down_revision = 'c3f58a0d6e21'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns); mirrored in the models' __table_args__
+INDEXES = [
+    ('ix_user_organization_id_role', 'user', ['organization_id', 'role']),
+    ('ix_attendance_session_organization_id_start_time', 'attendance_session', ['organization_id', 'start_time']),
+    ('ix_attendance_session_organization_id_date', 'attendance_session', ['organization_id', 'date']),
+    ('ix_attendance_session_status_start_time', 'attendance_session', ['status', 'start_time']),
+    ('ix_attendance_session_status_ends_at', 'attendance_session', ['status', 'ends_at']),
+    ('ix_attendance_record_user_id_timestamp', 'attendance_record', ['user_id', 'timestamp']),
+    ('ix_attendance_record_timestamp', 'attendance_record', ['timestamp']),
+]
+
+
+def upgrade():
+    # CONCURRENTLY on Postgres so a large attendance_record is not locked
+    # against the recognition writes while the indexes build
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
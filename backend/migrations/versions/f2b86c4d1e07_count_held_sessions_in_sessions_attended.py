@@ -0,0 +1,31 @@
+"""Count only held sessions in user.sessions_attended
+
+Revision ID: f2b86c4d1e07
+Revises: d9a4b3e17f56
+Create Date: 2025-05-21 14:03:18.472961
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b86c4d1e07'
+down_revision = 'd9a4b3e17f56'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # records of sessions that are still scheduled stop counting until they start
+    op.execute(
+        'UPDATE "user" SET sessions_attended = '
+        '(SELECT count(*) FROM attendance_record r JOIN attendance_session s ON s.id = r.session_id '
+        "WHERE r.user_id = \"user\".id AND s.status != 'SCHEDULED')"
+    )
+
+
+def downgrade():
+    op.execute(
+        'UPDATE "user" SET sessions_attended = '
+        '(SELECT count(*) FROM attendance_record r WHERE r.user_id = "user".id)'
+    )
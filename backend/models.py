@@ -14,6 +14,13 @@ class AttendanceStatusEnum(str, Enum):
     COMPLETED = "completed"
 
 
+class EnrollmentStatusEnum(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
 # ───────────────────────────────────────────────
 # ORGANIZATION MODEL
 # ───────────────────────────────────────────────
@@ -27,6 +34,7 @@ class Organization(db.Model):
 
     users = db.relationship('User', backref='organization', lazy=True, cascade="all, delete-orphan")
     sessions = db.relationship('AttendanceSession', backref='organization', lazy=True, cascade="all, delete-orphan")
+    daily_attendance = db.relationship('AttendanceDaily', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Organization {self.name}>"
@@ -48,6 +56,8 @@ class User(db.Model):
 
     role = db.Column(db.Enum('admin', 'supervisor', 'user', name='user_roles'), nullable=False, default='user')
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
+    # number of attendance records, kept in step by utils.attendance_counters
+    sessions_attended = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     attendance_sessions = db.relationship('AttendanceSession', backref='creator', lazy=True)
     records = db.relationship('AttendanceRecord', backref='user', lazy=True)
@@ -55,6 +65,11 @@ class User(db.Model):
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # org member lists, role counts and searches
+        db.Index('ix_user_organization_id_role', 'organization_id', 'role'),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -75,6 +90,16 @@ class User(db.Model):
 # ATTENDANCE SESSION MODEL
 # ───────────────────────────────────────────────
 
+DEFAULT_SESSION_MINUTES = 60
+# statuses that still change; listed (not != COMPLETED) so status indexes apply
+_PENDING_STATUSES = (AttendanceStatusEnum.SCHEDULED, AttendanceStatusEnum.ACTIVE)
+
+
+def _as_utc(value: datetime) -> datetime:
+    """SQLite returns timezone-aware columns as naive datetimes; everything is stored in UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
 class AttendanceSession(db.Model):
     __tablename__ = 'attendance_session'
 
@@ -85,7 +110,9 @@ class AttendanceSession(db.Model):
 
     date = db.Column(db.Date, default=lambda: datetime.now(timezone.utc).date())
     start_time = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
-    duration_minutes = db.Column(db.Integer, nullable=False, default=60)
+    duration_minutes = db.Column(db.Integer, nullable=False, default=DEFAULT_SESSION_MINUTES)
+    # start_time + duration_minutes, kept by _set_ends_at; status changes are scheduled on it
+    ends_at = db.Column(db.DateTime(timezone=True), nullable=False)
 
     status = db.Column(
         db.Enum(AttendanceStatusEnum),
@@ -95,45 +122,83 @@ class AttendanceSession(db.Model):
 
     organization_id = db.Column(db.Integer, db.ForeignKey('organization.id'), nullable=False)
     creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # number of attendance records, kept in step by utils.attendance_counters
+    attendee_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     records = db.relationship('AttendanceRecord', backref='session', lazy=True, cascade="all, delete-orphan")
 
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
     updated_at = db.Column(db.DateTime(timezone=True), onupdate=func.now())
 
+    __table_args__ = (
+        # session lists (newest first) and date-bounded reports per org
+        db.Index('ix_attendance_session_organization_id_start_time', 'organization_id', 'start_time'),
+        db.Index('ix_attendance_session_organization_id_date', 'organization_id', 'date'),
+        # the status scheduler's due and next-change lookups
+        db.Index('ix_attendance_session_status_start_time', 'status', 'start_time'),
+        db.Index('ix_attendance_session_status_ends_at', 'status', 'ends_at'),
+    )
+
     def end_time(self):
         return self.start_time + timedelta(minutes=self.duration_minutes)
 
     def update_status(self):
-        now = datetime.now(timezone.utc)
-        if now < self.start_time:
-            self.status = AttendanceStatusEnum.SCHEDULED
-        elif self.start_time <= now < self.end_time():
-            self.status = AttendanceStatusEnum.ACTIVE
-        else:
-            self.status = AttendanceStatusEnum.COMPLETED
+        self.status = self.computed_status
 
     @property
     def computed_status(self):
         now = datetime.now(timezone.utc)
-        if now < self.start_time:
+        start = _as_utc(self.start_time)
+        if now < start:
             return AttendanceStatusEnum.SCHEDULED
-        elif self.start_time <= now < self.end_time():
+        elif start <= now < start + timedelta(minutes=self.duration_minutes):
             return AttendanceStatusEnum.ACTIVE
         else:
             return AttendanceStatusEnum.COMPLETED
 
     @classmethod
-    def bulk_update_statuses(cls):
-        sessions = cls.query.all()
-        for session in sessions:
-            session.update_status()
+    def bulk_update_statuses(cls, now: datetime | None = None) -> int:
+        """Apply every due SCHEDULED -> ACTIVE -> COMPLETED move with set-based UPDATEs; returns rows changed."""
+        from utils.attendance_counters import count_held_sessions
+
+        now = now or datetime.now(timezone.utc)
+        # every SCHEDULED session that has started leaves SCHEDULED below
+        count_held_sessions(db.select(cls.id).where(
+            cls.status == AttendanceStatusEnum.SCHEDULED, cls.start_time <= now))
+        completed = cls.query.filter(
+            cls.status.in_(_PENDING_STATUSES), cls.ends_at <= now
+        ).update({"status": AttendanceStatusEnum.COMPLETED}, synchronize_session=False)
+        started = cls.query.filter(
+            cls.status == AttendanceStatusEnum.SCHEDULED, cls.start_time <= now, cls.ends_at > now
+        ).update({"status": AttendanceStatusEnum.ACTIVE}, synchronize_session=False)
         db.session.commit()
+        return completed + started
+
+    @classmethod
+    def next_status_change(cls, now: datetime | None = None) -> datetime | None:
+        """Earliest future start or end of a session whose status will change then."""
+        now = now or datetime.now(timezone.utc)
+        next_start = db.session.query(func.min(cls.start_time)).filter(
+            cls.status == AttendanceStatusEnum.SCHEDULED, cls.start_time > now).scalar_subquery()
+        next_end = db.session.query(func.min(cls.ends_at)).filter(
+            cls.status.in_(_PENDING_STATUSES), cls.ends_at > now).scalar_subquery()
+        due = [t for t in db.session.query(next_start, next_end).one() if t is not None]
+        return min(due) if due else None
 
     def __repr__(self):
         return f"<Session {self.title} [{self.status}]>"
 
 
+@db.event.listens_for(AttendanceSession, "before_insert")
+@db.event.listens_for(AttendanceSession, "before_update")
+def _set_ends_at(mapper, connection, session):
+    if session.start_time is None:
+        session.start_time = datetime.now(timezone.utc)
+    if session.duration_minutes is None:
+        session.duration_minutes = DEFAULT_SESSION_MINUTES
+    session.ends_at = session.end_time()
+
+
 # ───────────────────────────────────────────────
 # ATTENDANCE RECORD MODEL
 # ───────────────────────────────────────────────
@@ -147,8 +212,150 @@ class AttendanceRecord(db.Model):
     timestamp = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     __table_args__ = (
+        # also serves every lookup by session_id
         db.UniqueConstraint('session_id', 'user_id', name='unique_attendance_record'),
+        # a user's records, newest first
+        db.Index('ix_attendance_record_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_attendance_record_timestamp', 'timestamp'),
     )
 
     def __repr__(self):
         return f"<Record User {self.user_id} Session {self.session_id}>"
+
+
+# ───────────────────────────────────────────────
+# DAILY ATTENDANCE ROLLUP MODEL
+# ───────────────────────────────────────────────
+
+class AttendanceDaily(db.Model):
+    """
+    Sessions held and attendance recorded per org, session date and
+    location, kept in step by utils.attendance_counters so time-series
+    views read a few small rows instead of the record history.
+    """
+    __tablename__ = 'attendance_daily'
+
+    id = db.Column(db.Integer, primary_key=True)
+    organization_id = db.Column(db.Integer, db.ForeignKey('organization.id', ondelete='CASCADE'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    # '' for sessions without a location
+    location = db.Column(db.String(255), nullable=False, default='', server_default='')
+    sessions = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    records = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        db.UniqueConstraint('organization_id', 'day', 'location', name='unique_attendance_daily'),
+    )
+
+    def __repr__(self):
+        return f"<Daily Org {self.organization_id} {self.day} {self.location!r}: {self.records}/{self.sessions}>"
+
+
+# ───────────────────────────────────────────────
+# FACE ENCODING MODEL
+# ───────────────────────────────────────────────
+
+class FaceEncoding(db.Model):
+    """A user's representative vectors (see FaceSample); these are what galleries match against."""
+    __tablename__ = 'face_encoding'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    model_version = db.Column(db.String(50), nullable=False)
+    # representative number within the user's set, reported by matches
+    slot = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # 128-d float64 vector as raw bytes (numpy .tobytes())
+    encoding = db.Column(db.LargeBinary, nullable=False)
+    # photo a medoid was taken from; None for a centroid
+    source_image = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), onupdate=func.now())
+
+    user = db.relationship('User', backref=db.backref('face_encodings', lazy=True, cascade="all, delete-orphan"))
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'model_version', 'slot', name='unique_user_face_encoding_slot'),
+    )
+
+    def __repr__(self):
+        return f"<FaceEncoding User {self.user_id} #{self.slot} [{self.model_version}]>"
+
+
+# ───────────────────────────────────────────────
+# FACE SAMPLE MODEL
+# ───────────────────────────────────────────────
+
+class FaceSample(db.Model):
+    """One enrolled photo's encoding; compacted into FaceEncoding representatives."""
+    __tablename__ = 'face_sample'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    image_url = db.Column(db.String(255), nullable=True)
+    # the sample taken from User.image_url; replaced when the profile photo changes
+    is_primary = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    model_version = db.Column(db.String(50), nullable=False)
+    encoding = db.Column(db.LargeBinary, nullable=False)
+
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+
+    user = db.relationship('User', backref=db.backref('face_samples', lazy=True, cascade="all, delete-orphan"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "image_url": self.image_url,
+            "is_primary": self.is_primary,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+    def __repr__(self):
+        return f"<FaceSample {self.id} User {self.user_id} [{self.model_version}]>"
+
+
+# ───────────────────────────────────────────────
+# ENROLLMENT JOB MODEL
+# ───────────────────────────────────────────────
+
+class EnrollmentJob(db.Model):
+    __tablename__ = 'enrollment_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    image_url = db.Column(db.String(255), nullable=False)
+
+    status = db.Column(
+        db.Enum(EnrollmentStatusEnum),
+        default=EnrollmentStatusEnum.QUEUED,
+        nullable=False,
+        index=True
+    )
+    # "profile" re-enrolls User.image_url, "sample" adds an extra photo
+    kind = db.Column(db.String(10), nullable=False, default='profile', server_default='profile')
+    # last pipeline step reached: queued, encoding, storing, done
+    stage = db.Column(db.String(20), nullable=False, default='queued')
+    error = db.Column(db.String(255), nullable=True)
+
+    created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    started_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_at = db.Column(db.DateTime(timezone=True), nullable=True)
+
+    user = db.relationship('User', backref=db.backref('enrollment_jobs', lazy=True, cascade="all, delete-orphan"))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "user_id": self.user_id,
+            "kind": self.kind,
+            "image_url": self.image_url,
+            "status": self.status.value,
+            "stage": self.stage,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __repr__(self):
+        return f"<EnrollmentJob {self.id} User {self.user_id} [{self.status}]>"
@@ -1,13 +1,17 @@
 from flask import Blueprint, request, jsonify, current_app
 
 from config import db
-from models import AttendanceRecord, AttendanceSession, User
+from models import AttendanceRecord, AttendanceSession, AttendanceStatusEnum, User
 from datetime import datetime, timezone, timedelta, date
 import calendar  # for monthrange
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from middleware import supervisor_required
 from utils.pagination_utils import paginate_query
+from utils.image_variants import variant_url
+from utils.attendance_counters import count_attendance, count_held_sessions, count_session, forget_session
+from utils.session_scheduler import get_session_scheduler
+from utils.attendance_stats import daily_attendance, percentage, users_with_attendance
 from dateutil import parser  # pip install python-dateutil
 
 attendance_bp = Blueprint('attendance', __name__)
@@ -35,7 +39,11 @@ def create_session():
     )
 
     db.session.add(session)
+    db.session.flush()
+    count_session(session)
     db.session.commit()
+    # its start (or end) may now be the next status change
+    get_session_scheduler().notify()
 
     return jsonify({"message": "Session created", "session_id": session.id}), 201
 
@@ -65,7 +73,7 @@ def get_all_sessions():
         "duration_minutes": s.duration_minutes,
         "status": s.computed_status,
         "location": s.location,
-        "attendees": len(s.records)
+        "attendees": s.attendee_count
     } for s in paginated]
 
     return jsonify({
@@ -84,9 +92,6 @@ def get_session_details(session_id):
     if user.organization_id != session.organization_id:
         return {"message": "Unauthorized"}, 403
 
-    session.update_status()
-    db.session.commit()
-
     return jsonify({
         "id": session.id,
         "title": session.title,
@@ -113,7 +118,11 @@ def update_session_status(session_id):
     if user.role not in ["admin", "supervisor"] or user.organization_id != session.organization_id:
         return {"message": "Unauthorized"}, 403
 
+    was_scheduled = session.status == AttendanceStatusEnum.SCHEDULED
     session.update_status()
+    is_scheduled = session.status == AttendanceStatusEnum.SCHEDULED
+    if was_scheduled != is_scheduled:
+        count_held_sessions([session.id], sign=1 if was_scheduled else -1)
     db.session.commit()
 
     return jsonify({"message": "Status updated", "status": session.status})
@@ -130,6 +139,7 @@ def delete_session(session_id):
     if user.role not in ["admin", "supervisor"] or user.organization_id != session.organization_id:
         return {"message": "Unauthorized"}, 403
 
+    forget_session(session)
     db.session.delete(session)
     db.session.commit()
 
@@ -185,32 +195,20 @@ def get_my_attendance_percentage():
     start_date = request.args.get("start")
     end_date = request.args.get("end")
 
-    session_query = AttendanceSession.query.filter_by(
-        organization_id=user.organization_id
-    ).filter(AttendanceSession.status != "scheduled")
-
-    if start_date:
-        session_query = session_query.filter(AttendanceSession.date >= parser.parse(start_date).date())
-    if end_date:
-        session_query = session_query.filter(AttendanceSession.date <= parser.parse(end_date).date())
-
-    total_sessions = session_query.count()
-
-    # Only fetch attendance records for filtered sessions
-    session_ids = [s.id for s in session_query.all()]
-    attended_sessions = AttendanceRecord.query.filter(
-        AttendanceRecord.user_id == user.id,
-        AttendanceRecord.session_id.in_(session_ids)
-    ).count()
-
-    percentage = round((attended_sessions / total_sessions) * 100, 2) if total_sessions else 0.0
+    total_sessions, rows = users_with_attendance(
+        user.organization_id,
+        start=parser.parse(start_date).date() if start_date else None,
+        end=parser.parse(end_date).date() if end_date else None,
+        user_ids=[user.id],
+    )
+    attended_sessions = rows[0][1] if rows else 0
 
     return jsonify({
         "user_id": user.id,
         "name": user.name,
         "total_sessions": total_sessions,
         "attended_sessions": attended_sessions,
-        "attendance_percentage": percentage
+        "attendance_percentage": percentage(attended_sessions, total_sessions)
     })
 
 
@@ -233,6 +231,7 @@ def mark_attendance():
 
         new_record = AttendanceRecord(user_id=user_id, session_id=session_id)
         db.session.add(new_record)
+        count_attendance([(session_id, user_id)])
         db.session.commit()
 
         return jsonify({"message": "Attendance recorded successfully!"}), 201
@@ -277,6 +276,7 @@ def get_latest_attendance_records():
         "name": r.user.name,
         "email": r.user.email,
         "image_url": r.user.image_url,
+        "avatar_url": variant_url(r.user.image_url, "avatar"),
         "session_title": r.session.title,
         "timestamp": r.timestamp.isoformat(),
         "status": r.session.computed_status
@@ -335,16 +335,12 @@ def get_weekly_attendance():
     # get current user & their org
     user = User.query.get_or_404(int(get_jwt_identity()))
 
+    # one read of the month's daily rollup rows, bucketed into weeks
+    daily = daily_attendance(user.organization_id, first_day, last_day, request.args.get("location"))
+
     results = []
     for start, end in weeks:
-        count = (
-            db.session.query(AttendanceRecord)
-            .join(AttendanceSession, AttendanceRecord.session_id == AttendanceSession.id)
-            .filter(AttendanceSession.organization_id == user.organization_id)
-            .filter(AttendanceRecord.timestamp >= datetime.combine(start, datetime.min.time(), tzinfo=timezone.utc))
-            .filter(AttendanceRecord.timestamp <  datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc))
-            .count()
-        )
+        count = sum(totals.records for day, totals in daily.items() if start <= day <= end)
         results.append({
             "week_start": start.isoformat(),
             "week_end":   end.isoformat(),
@@ -355,6 +351,31 @@ def get_weekly_attendance():
         "month": f"{year:04d}-{month:02d}",
         "weeks": results
     })
+
+
+@attendance_bp.route("/trend", methods=["GET"])
+@jwt_required()
+def get_attendance_trend():
+    """Sessions held and attendance recorded per day, for charts (default: the last 30 days)."""
+    try:
+        end = parser.parse(request.args["end"]).date() if request.args.get("end") else datetime.now(timezone.utc).date()
+        start = parser.parse(request.args["start"]).date() if request.args.get("start") else end - timedelta(days=29)
+    except (ValueError, OverflowError):
+        return jsonify({"message": "start and end must be dates (YYYY-MM-DD)"}), 400
+    if start > end or (end - start).days > 366:
+        return jsonify({"message": "start must be before end and at most a year apart"}), 400
+
+    user = User.query.get_or_404(int(get_jwt_identity()))
+    daily = daily_attendance(user.organization_id, start, end, request.args.get("location"))
+
+    days = []
+    day = start
+    while day <= end:
+        sessions, records = daily.get(day, (0, 0))
+        days.append({"date": day.isoformat(), "sessions": sessions, "attendee_count": records})
+        day += timedelta(days=1)
+
+    return jsonify({"start": start.isoformat(), "end": end.isoformat(), "days": days})
     
     
 
@@ -366,32 +387,19 @@ def users_attendance_summary():
     if requester.role not in ("admin", "supervisor"):
         return jsonify({"message": "Unauthorized"}), 403
 
-    # all non‐scheduled sessions in this org
-    sessions = AttendanceSession.query \
-        .filter_by(organization_id=requester.organization_id) \
-        .filter(AttendanceSession.status != "scheduled") \
-        .all()
-    session_ids = [s.id for s in sessions]
-    total_sessions = len(sessions)
-
-    users = User.query.filter_by(organization_id=requester.organization_id).all()
-    result = []
-    for u in users:
-        attended = db.session.query(AttendanceRecord) \
-            .filter(AttendanceRecord.user_id == u.id) \
-            .filter(AttendanceRecord.session_id.in_(session_ids)) \
-            .count()
-        pct = round((attended / total_sessions) * 100, 2) if total_sessions else 0.0
-
-        result.append({
-            "user_id": u.id,
-            "name": u.name,
-            "email": u.email,
-            "image_url": u.image_url,
-            "total_sessions": total_sessions,
-            "attended_sessions": attended,
-            "attendance_percentage": pct
-        })
+    # non‐scheduled sessions in this org, and how many of them each user attended
+    total_sessions, users = users_with_attendance(requester.organization_id)
+
+    result = [{
+        "user_id": u.id,
+        "name": u.name,
+        "email": u.email,
+        "image_url": u.image_url,
+        "avatar_url": variant_url(u.image_url, "avatar"),
+        "total_sessions": total_sessions,
+        "attended_sessions": attended,
+        "attendance_percentage": percentage(attended, total_sessions)
+    } for u, attended in users]
 
     return jsonify(result), 200
 
@@ -413,22 +421,17 @@ def sessions_attendance_summary():
     # total users (you can filter by role='user' if you only want end‐users)
     total_users = User.query.filter_by(organization_id=requester.organization_id).count()
 
-    result = []
-    for s in sessions:
-        count = len(s.records)
-        pct = round((count / total_users) * 100, 2) if total_users else 0.0
-
-        result.append({
-            "session_id": s.id,
-            "title": s.title,
-            "date": s.date.isoformat(),
-            "start_time": s.start_time.isoformat(),
-            "duration_minutes": s.duration_minutes,
-            "location": s.location,
-            "status": s.computed_status,
-            "total_users": total_users,
-            "attended_sessions": count,
-            "attendance_percentage": pct
-        })
+    result = [{
+        "session_id": s.id,
+        "title": s.title,
+        "date": s.date.isoformat(),
+        "start_time": s.start_time.isoformat(),
+        "duration_minutes": s.duration_minutes,
+        "location": s.location,
+        "status": s.computed_status,
+        "total_users": total_users,
+        "attended_sessions": s.attendee_count,
+        "attendance_percentage": percentage(s.attendee_count, total_users)
+    } for s in sessions]
 
     return jsonify(result), 200
@@ -5,6 +5,7 @@ from models import User, Organization
 from config import db
 
 from utils.auth_utils import generate_jwt_tokens
+from utils.enrollment_jobs import queue_enrollment
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -45,13 +46,23 @@ def register():
         db.session.add(new_user)
         db.session.commit()
 
+        # face extraction runs in the background; clients poll /upload/jobs/<id>
+        enrollment_job = None
+        if image_url:
+            try:
+                enrollment_job = queue_enrollment(new_user)
+            except Exception as e:
+                current_app.logger.error(f"Face enrollment error: {e}")
+                db.session.rollback()
+
         # Generate Access and Refresh Tokens
         access_token, refresh_token = generate_jwt_tokens(new_user)
 
         return jsonify({
             "message": "User registered successfully!",
             "access_token": access_token,
-            "refresh_token": refresh_token
+            "refresh_token": refresh_token,
+            "enrollment_job_id": enrollment_job.id if enrollment_job else None
         }), 201
 
     except Exception as e:
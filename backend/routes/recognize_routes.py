@@ -6,36 +6,26 @@ import time
 import cv2
 import numpy as np
 import face_recognition
-from flask import Blueprint, jsonify, request, Response, stream_with_context
+from flask import Blueprint, jsonify, request, Response, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from config import db
 from models import AttendanceSession, AttendanceRecord, User
-from utils.face_utils import load_known_faces
+from utils.face_utils import load_known_faces, detect_and_encode
+from utils.encoding_pool import get_encoding_pool
+from utils.attendance_writer import get_attendance_writer
+from utils.recognizer import SessionRecognizer
+from utils.detection_control import DetectionScaleController
+from utils.motion_gate import MotionGate
+from utils.stream_pipeline import StreamPipeline, draw_labels
+from utils.stream_hub import stream_hub, CameraBusy
+from utils.stream_quality import ViewerQuality
+from utils.video_source import open_video_source, resolve_source, PACE_REALTIME, PACE_MAX
 
 log = logging.getLogger(__name__)
 recognize_bp = Blueprint('recognize', __name__)
 
 
-def _draw_labels(frame: np.ndarray, locs: list, names: list[str]) -> np.ndarray:
-    """
-    Draw bounding boxes and names on the frame at its native resolution.
-    """
-    for (top, right, bottom, left), name in zip(locs, names):
-        color = (39, 123, 62) if name != "Unknown" else (89, 14, 195)
-        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
-        cv2.rectangle(frame, (left, top - 20), (right, top), color, cv2.FILLED)
-        cv2.putText(
-            frame,
-            name,
-            (left + 6, top - 6),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (255, 255, 255),
-            1
-        )
-    return frame
-
-
 def _play_alert():
     """Beep on no-face timeout."""
     if platform.system() == "Windows":
@@ -46,28 +36,49 @@ def _play_alert():
         os.system('echo -e "\a"')
 
 
+def _requested_source():
+    """
+    (source spec, pace) from the query string: `source`, falling back to the
+    legacy `camera` index, then VIDEO_SOURCE. Raises ValueError if invalid.
+    Network streams are limited to VIDEO_CAMERAS and VIDEO_SOURCE.
+    """
+    config = current_app.config
+    spec = request.args.get('source') or request.args.get('camera') or config['VIDEO_SOURCE']
+    pace = request.args.get('pace', PACE_REALTIME)
+    if pace not in (PACE_REALTIME, PACE_MAX):
+        raise ValueError(f"pace must be '{PACE_REALTIME}' or '{PACE_MAX}'.")
+    cameras = {**config['VIDEO_CAMERAS'], 'default': config['VIDEO_SOURCE']}
+    return resolve_source(spec, config['VIDEO_REPLAY_DIR'], cameras), pace
+
+
 @recognize_bp.route("/window/<int:session_id>", methods=["GET"])
 def recognize(session_id):
     """
     Real-time face recognition via OpenCV window for an attendance session.
     Press 'q' to end, or auto-stop after `timeout` seconds of no detection.
     Query params:
-      camera: camera index (default 0)
+      source: camera index, a VIDEO_CAMERAS name, or a recording under
+              VIDEO_REPLAY_DIR (default VIDEO_SOURCE; `camera` is accepted as an alias)
+      pace: "realtime" replays recordings at their FPS, "max" as fast as possible
       timeout: seconds to auto-stop on no face (default 30)
     """
     session = AttendanceSession.query.get(session_id)
     if not session:
         return jsonify({"message": "Attendance session not found."}), 404
 
-    known_encs, known_ids = load_known_faces(session.organization_id)
+    gallery = load_known_faces(session.organization_id)
     users = {u.id: u for u in User.query.filter_by(organization_id=session.organization_id)}
     existing = {r.user_id for r in AttendanceRecord.query.filter_by(session_id=session.id)}
+    recognizer = SessionRecognizer(session.id, gallery, users, existing)
 
-    cam_idx = int(request.args.get('camera', 0))
+    try:
+        source, pace = _requested_source()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     timeout_s = int(request.args.get('timeout', 30))
-    cap = cv2.VideoCapture(cam_idx, cv2.CAP_DSHOW)
+    cap = open_video_source(source, pace=pace)
     if not cap.isOpened():
-        log.error("Cannot open camera %s", cam_idx)
+        log.error("Cannot open video source %s", source)
         return jsonify({"message": "Failed to access camera."}), 500
 
     last_detect = time.time()
@@ -89,29 +100,9 @@ def recognize(session_id):
                 _play_alert()
                 break
 
-            names = []
-            for fe in encs:
-                name = "Unknown"
-                if known_encs:
-                    dists = face_recognition.face_distance(known_encs, fe)
-                    idx = np.argmin(dists)
-                    if dists[idx] < 0.5:
-                        uid = known_ids[idx]
-                        user = users.get(uid)
-                        if user:
-                            if uid not in existing:
-                                try:
-                                    rec = AttendanceRecord(session_id=session.id, user_id=uid)
-                                    db.session.add(rec)
-                                    db.session.commit()
-                                    existing.add(uid)
-                                    log.info("Recorded %s in session %s", uid, session_id)
-                                except Exception:
-                                    log.exception("Error recording attendance")
-                            name = user.name
-                names.append(name)
-
-            annotated = _draw_labels(frame.copy(), locs, names)
+            names = recognizer.identify(encs)
+
+            annotated = draw_labels(frame.copy(), locs, names)
             cv2.imshow(f"Session {session.id}", annotated)
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
@@ -126,88 +117,145 @@ def recognize(session_id):
 @recognize_bp.route("/<int:session_id>", methods=["GET"])
 def stream(session_id):
     """
-    MJPEG browser stream: detects at lower res, then draws labels on full-resolution frame.
+    MJPEG browser stream: capture, recognition and JPEG encoding run as separate
+    pipeline stages; detection runs at an adaptive lower res (see
+    DetectionScaleController), labels are drawn on the full-resolution frame.
+    Viewers of the same camera share one pipeline; skip is taken from the
+    viewer that started it. Each viewer's JPEG quality, size and frame rate
+    adapt to how fast it drains frames, within the STREAM_* config limits.
     Query params:
-      camera (int): camera index (default 0)
+      source (str): camera index, a VIDEO_CAMERAS name, or a recording under
+                    VIDEO_REPLAY_DIR (default VIDEO_SOURCE; `camera` is an alias)
+      pace (str): "realtime" or "max" replay speed for recordings
+      loop (int): 1 to loop a recording (default 0)
       skip (int): detect every nth frame (default 3)
-      quality (int): JPEG quality 0-100 (default 50)
+      quality (int): maximum JPEG quality 0-100 (default 50)
     """
     session = AttendanceSession.query.get(session_id)
     if not session:
         return jsonify({"message": "Session not found."}), 404
 
-    known_encs, known_ids = load_known_faces(session.organization_id)
-    users = {u.id: u for u in User.query.filter_by(organization_id=session.organization_id)}
-    existing = {r.user_id for r in AttendanceRecord.query.filter_by(session_id=session.id)}
-
-    cam_idx = int(request.args.get('camera', 0))
+    try:
+        source, pace = _requested_source()
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    loop = request.args.get('loop', '0') == '1'
     skip = int(request.args.get('skip', 3))
     quality = int(request.args.get('quality', 50))
+    camera_key = source
+    label = os.path.basename(source.rstrip('/')) or source
+    app = current_app._get_current_object()
 
-    cap = cv2.VideoCapture(cam_idx, cv2.CAP_DSHOW)
-    if not cap.isOpened():
+    def start_pipeline():
+        cap = open_video_source(source, pace=pace, loop=loop)
+        if not cap.isOpened():
+            raise IOError(f"Cannot open video source {source}")
+        gallery = load_known_faces(session.organization_id)
+        users = {u.id: u for u in User.query.filter_by(organization_id=session.organization_id)}
+        existing = {r.user_id for r in AttendanceRecord.query.filter_by(session_id=session.id)}
+        name = f"session-{session.id}-cam-{label}"
+        detection = DetectionScaleController(app.config['DETECT_BUDGET_MS'], name=name)
+        motion = MotionGate(app.config['MOTION_MIN_FRACTION'], app.config['MOTION_FORCE_SECONDS'])
+        recognizer = SessionRecognizer(session.id, gallery, users, existing, detection, motion)
+        return StreamPipeline(app, cap, recognizer, skip=skip, quality=quality, name=name).start()
+
+    try:
+        pipeline = stream_hub.acquire(camera_key, session.id, start_pipeline)
+    except CameraBusy as e:
+        return jsonify({"message": str(e)}), 409
+    except IOError:
         return jsonify({"message": "Cannot open camera."}), 500
 
+    viewer = ViewerQuality(
+        max_quality=quality,
+        min_quality=app.config['STREAM_MIN_QUALITY'],
+        min_scale=app.config['STREAM_MIN_SCALE'],
+        max_stride=app.config['STREAM_MAX_FRAME_STRIDE'],
+        target_fps=app.config['STREAM_TARGET_FPS'],
+        name=f"camera-{label}-viewer",
+    )
+
     def generate():
-        frame_count = 0
-        last_locs, last_names = [], []
-        try:
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frame_count += 1
-
-                # Prepare small frame for detection
-                small = cv2.resize(frame, (320, 240))
-                rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-
-                # Detection & record every skip frames
-                if frame_count % skip == 0:
-                    locs = face_recognition.face_locations(rgb_small)
-                    encs = face_recognition.face_encodings(rgb_small, locs)
-                    names = []
-                    for fe in encs:
-                        name = "Unknown"
-                        if known_encs:
-                            dists = face_recognition.face_distance(known_encs, fe)
-                            idx = np.argmin(dists)
-                            if dists[idx] < 0.5:
-                                uid = known_ids[idx]
-                                user = users.get(uid)
-                                if user and uid not in existing:
-                                    try:
-                                        rec = AttendanceRecord(session_id=session.id, user_id=uid)
-                                        db.session.add(rec)
-                                        db.session.commit()
-                                        existing.add(uid)
-                                    except Exception:
-                                        log.exception("Failed to record attendance for user %s in session %s", uid, session.id)
-                                
-                                name = user.name if user else "Unknown"
-                        names.append(name)
-                    last_locs, last_names = locs, names
-
-                # Scale locations to full frame
-                h_ratio = frame.shape[0] / 240
-                w_ratio = frame.shape[1] / 320
-                scaled_locs = [(
-                    int(top * h_ratio),
-                    int(right * w_ratio),
-                    int(bottom * h_ratio),
-                    int(left * w_ratio)
-                ) for (top, right, bottom, left) in last_locs]
-
-                # Draw on full-resolution frame
-                annotated_full = _draw_labels(frame.copy(), scaled_locs, last_names)
-
-                ret2, jpg = cv2.imencode('.jpg', annotated_full, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
-                if not ret2:
-                    continue
-                yield (b'--frame\r\n'
-                    b'Content-Type: image/jpeg\r\n\r\n' + jpg.tobytes() + b'\r\n')
-            
-        finally:
-            cap.release()
-
-    return Response(stream_with_context(generate()), mimetype='multipart/x-mixed-replace; boundary=frame')
+        for jpg in pipeline.jpeg_frames(viewer):
+            yield (b'--frame\r\n'
+                b'Content-Type: image/jpeg\r\n\r\n' + jpg + b'\r\n')
+
+    response = Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    # also covers clients that disconnect before the first frame
+    response.call_on_close(lambda: stream_hub.release(camera_key, pipeline))
+    return response
+
+
+@recognize_bp.route("/<int:session_id>/frames", methods=["POST"])
+@jwt_required()
+def recognize_frames(session_id):
+    """
+    Recognition for frames pushed by remote kiosks instead of a local camera.
+    Accepts one or more images as multipart `frames` fields, or a single
+    image as the raw request body (Content-Type: image/jpeg). Frames are
+    decoded and detected/encoded in parallel on the encoding pool, then every
+    face from every frame is matched against the org gallery in one batch.
+    Returns per-frame matches, including which of the user's representative
+    encodings matched; first sightings are recorded as attendance.
+    Kiosks authenticate as an admin or supervisor of the session's org.
+    """
+    user = User.query.get(int(get_jwt_identity()))
+    session = AttendanceSession.query.get(session_id)
+    if not session:
+        return jsonify({"message": "Session not found."}), 404
+    if not user or user.role not in ["admin", "supervisor"] or user.organization_id != session.organization_id:
+        return jsonify({"message": "Unauthorized"}), 403
+
+    if request.files:
+        payloads = [f.read() for f in request.files.getlist('frames')]
+    else:
+        payloads = [request.get_data()]
+    payloads = [p for p in payloads if p]
+    if not payloads:
+        return jsonify({"message": "No frames provided."}), 400
+    max_frames = current_app.config['RECOGNIZE_MAX_FRAMES']
+    if len(payloads) > max_frames:
+        return jsonify({"message": f"At most {max_frames} frames per request."}), 400
+
+    pool = get_encoding_pool()
+    futures = [pool.submit(detect_and_encode, p) for p in payloads]
+    decoded = [f.result() for f in futures]
+
+    # one matrix match for all faces across all frames
+    gallery = load_known_faces(session.organization_id)
+    all_encs = [e for d in decoded if d for e in d[1]]
+    matches = gallery.match(np.asarray(all_encs)) if all_encs else []
+
+    matched_ids = {m.user_id for m in matches if m.user_id is not None}
+    names, already = {}, set()
+    if matched_ids:
+        names = dict(db.session.query(User.id, User.name).filter(
+            User.id.in_(matched_ids), User.organization_id == session.organization_id).all())
+        already = {uid for (uid,) in db.session.query(AttendanceRecord.user_id).filter(
+            AttendanceRecord.session_id == session.id, AttendanceRecord.user_id.in_(names))}
+
+    # rows still buffered in the writer are not in the table yet; record()
+    # refuses those, so only first sightings report `recorded`
+    writer = get_attendance_writer()
+    recorded = {uid for uid in names.keys() - already if writer.record(session.id, uid)}
+
+    results, it = [], iter(matches)
+    for idx, d in enumerate(decoded):
+        if d is None:
+            results.append({"index": idx, "error": "Could not decode image."})
+            continue
+        faces = []
+        for loc in d[0]:
+            m = next(it)
+            uid = m.user_id if m.user_id in names else None
+            faces.append({
+                "box": {"top": loc[0], "right": loc[1], "bottom": loc[2], "left": loc[3]},
+                "user_id": uid,
+                "name": names.get(uid, "Unknown"),
+                "distance": round(m.distance, 4) if np.isfinite(m.distance) else None,
+                "representative": m.slot if uid is not None else None,
+                "recorded": uid in recorded,
+            })
+        results.append({"index": idx, "faces": faces})
+
+    return jsonify({"session_id": session.id, "frames": results}), 200
@@ -1,7 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
-from models import AttendanceRecord, AttendanceSession, User, Organization
-from config import db
-from sqlalchemy import func
+from models import AttendanceSession, User
+from utils.attendance_stats import org_totals
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 stats_bp = Blueprint('stats', __name__)
@@ -11,7 +10,7 @@ stats_bp = Blueprint('stats', __name__)
 def get_statistics():
     try:
         current_user_id = int(get_jwt_identity())
-        user = User.query.filter_by(current_user_id).first()
+        user = User.query.get(current_user_id)
         if not user:
             return jsonify({"message": "User not found."}), 404
 
@@ -22,9 +21,7 @@ def get_statistics():
         organization_id = user.organization_id
 
         # Get total users, sessions, and records for the organization
-        total_users = db.session.query(func.count(User.id)).filter_by(organization_id=organization_id).scalar()
-        total_sessions = db.session.query(func.count(AttendanceSession.id)).filter_by(organization_id=organization_id).scalar()
-        total_records = db.session.query(func.count(AttendanceRecord.id)).join(AttendanceSession).filter(AttendanceSession.organization_id == organization_id).scalar()
+        total_users, total_sessions, total_records = org_totals(organization_id)
 
         # Calculate average attendance rate (percentage)
         average_attendance_rate = (total_records / (total_users * total_sessions) * 100) if total_users > 0 and total_sessions > 0 else 0
@@ -32,9 +29,9 @@ def get_statistics():
         # Get session-wise breakdown with record counts
         session_stats = []
         sessions = AttendanceSession.query.filter_by(organization_id=organization_id).all()
-        
+
         for session in sessions:
-            attendance_count = db.session.query(func.count(AttendanceRecord.id)).filter_by(session_id=session.id).scalar()
+            attendance_count = session.attendee_count
             session_stats.append({
                 "session_id": session.id,
                 "title": session.title,
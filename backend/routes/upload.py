@@ -1,45 +1,59 @@
-import os
-import uuid
-from flask import Blueprint, request, jsonify, send_from_directory, current_app
-from werkzeug.utils import secure_filename
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 
-upload_bp = Blueprint('upload', __name__)
+from config import db
+from models import User, EnrollmentJob
+from utils.auth_utils import can_manage_user
+from utils.enrollment_jobs import queue_enrollment, queue_position
+from utils.uploads import save_upload
+from utils.image_variants import send_upload
 
-def allowed_file(filename: str) -> bool:
-    allowed_exts = current_app.config['ALLOWED_EXTENSIONS']
-    return (
-        '.' in filename and 
-        filename.rsplit('.', 1)[1].lower() in allowed_exts
-    )
+upload_bp = Blueprint('upload', __name__)
 
 @upload_bp.route("/", methods=["POST"])
 def upload_image():
+    """
+    Store an image and return its URL. With a `user_id` form field (and a
+    token for that user or their supervisor) the image becomes the user's
+    photo and a background enrollment job is queued; poll /upload/jobs/<id>.
+    """
+    target = None
+    if request.form.get('user_id'):
+        verify_jwt_in_request()
+        target = User.query.get(request.form.get('user_id', type=int))
+        if not target:
+            return jsonify({"message": "User not found."}), 404
+        if not can_manage_user(User.query.get(int(get_jwt_identity())), target):
+            return jsonify({"message": "Unauthorized access."}), 403
+
     if 'file' not in request.files:
         return jsonify({"message": "No file part in request."}), 400
 
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({"message": "No selected file."}), 400
+    try:
+        image_url = save_upload(request.files['file'])
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    if not allowed_file(file.filename):
-        return jsonify({"message": "Unsupported file type."}), 400
+    if target is None:
+        return jsonify({"url": image_url}), 201
 
-    # pull the absolute folder from config
-    upload_folder = current_app.config['UPLOAD_FOLDER']
+    target.image_url = image_url
+    db.session.commit()
+    job = queue_enrollment(target)
+    return jsonify({"url": image_url, "job_id": job.id, "status": job.status.value}), 202
 
-    # create a unique, safe filename
-    ext = file.filename.rsplit('.', 1)[1].lower()
-    filename = f"{uuid.uuid4().hex}.{ext}"
-    save_path = os.path.join(upload_folder, secure_filename(filename))
 
-    # save it
-    file.save(save_path)
+@upload_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required()
+def enrollment_job_status(job_id):
+    """Progress of a background enrollment job."""
+    job = EnrollmentJob.query.get(job_id)
+    if not job or not can_manage_user(User.query.get(int(get_jwt_identity())), job.user):
+        return jsonify({"message": "Enrollment job not found."}), 404
+    return jsonify({**job.to_dict(), "queue_position": queue_position(job)}), 200
 
-    # build the public URL
-    image_url = f"{request.url_root.rstrip('/')}/upload/{filename}"
-    return jsonify({"url": image_url}), 201
 
 @upload_bp.route('/<path:filename>')
 def uploaded_file(filename):
-    upload_folder = current_app.config['UPLOAD_FOLDER']
-    return send_from_directory(upload_folder, filename)
+    """The original image, or a derivative with ?size=avatar|thumb."""
+    return send_upload(filename, request.args.get('size'))
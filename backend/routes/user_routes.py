@@ -1,9 +1,18 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import get_jwt_identity, jwt_required
 from sqlalchemy.orm import load_only
-from models import AttendanceRecord, AttendanceSession, User
+from models import (AttendanceRecord, AttendanceSession, User, FaceSample, FaceEncoding,
+                    EnrollmentJob, EnrollmentStatusEnum)
 from config import db
 from sqlalchemy import func, extract
+from utils.face_utils import (cache_representatives, remove_cached_face, refresh_representatives,
+                              FACE_MODEL_VERSION, MAX_SAMPLES_PER_USER)
+from utils.enrollment_jobs import queue_enrollment
+from utils.auth_utils import can_manage_user
+from utils.attendance_counters import forget_user
+from utils.attendance_stats import monthly_attendance, org_totals
+from utils.uploads import save_upload
+from utils.image_variants import variant_url
 
 user_bp = Blueprint('user', __name__)
 
@@ -36,6 +45,7 @@ def get_users():
                 "name": user.name,
                 "email": user.email,
                 "image_url": user.image_url,
+                "avatar_url": variant_url(user.image_url, "avatar"),
                 "role": user.role,
             }
             for user in users
@@ -68,7 +78,8 @@ def get_user_attendance(user_id):
         "user_id": user.user_id,
         "name": user.name,
         "email": user.email,
-        "attendance_count": attendance_query.count(),
+        # held sessions attended, as in the attendance percentages
+        "attendance_count": user.sessions_attended,
         "image_url": user.image_url,
         "records": [
             {"session_id": record.session_id, "timestamp": record.timestamp}
@@ -90,9 +101,12 @@ def delete_user(id):
     if not user:
         return jsonify({"error": "User not found or not in your organization."}), 404
 
+    organization_id, deleted_id = user.organization_id, user.id
+    forget_user(user.id)
     AttendanceRecord.query.filter_by(user_id=user.id).delete()
     db.session.delete(user)
     db.session.commit()
+    remove_cached_face(organization_id, deleted_id)
     return jsonify({"message": "User and associated attendance records deleted successfully!"})
 
 
@@ -125,12 +139,23 @@ def edit_user(id):
         user.email = email
     if user_id and current_user.role == "supervisor":
         user.user_id = user_id 
+    image_changed = bool(image_url) and image_url != user.image_url
     if image_url:
         user.image_url = image_url
 
     try:
         db.session.commit()
-        return jsonify({"message": "User details updated successfully!"}), 200
+        enrollment_job = None
+        if image_changed:
+            try:
+                enrollment_job = queue_enrollment(user)
+            except Exception as e:
+                current_app.logger.error(f"Face enrollment error: {e}")
+                db.session.rollback()
+        return jsonify({
+            "message": "User details updated successfully!",
+            "enrollment_job_id": enrollment_job.id if enrollment_job else None
+        }), 200
     except Exception as e:
         current_app.logger.error(f"Error updating user: {e}")
         db.session.rollback()
@@ -210,7 +235,7 @@ def get_organization_stats():
     
     num_supervisors = User.query.filter_by(organization_id=organization_id, role="supervisor").count()
     num_staff = User.query.filter_by(organization_id=organization_id, role="user").count()
-    num_logs = AttendanceRecord.query.join(AttendanceSession).filter(AttendanceSession.organization_id == organization_id).count()
+    num_logs = org_totals(organization_id).records
     
     return jsonify({
         "num_supervisors": num_supervisors,
@@ -241,6 +266,7 @@ def search_user():
             "name": user.name,
             "email": user.email,
             "image_url": user.image_url,
+            "avatar_url": variant_url(user.image_url, "avatar"),
             "role": user.role,
         }
         for user in users
@@ -257,15 +283,12 @@ def get_user_attendance_summary():
     user_id = int(get_jwt_identity())
     user = User.query.get_or_404(user_id)
 
-    # 1. Total sessions in user's organization
-    total_sessions = AttendanceSession.query.filter_by(
-        organization_id=user.organization_id
-    ).count()
+    # 1. Sessions held per month in user's organization (daily rollup), and in total
+    monthly_sessions = monthly_attendance(user.organization_id)
+    total_sessions = sum(totals.sessions for _, _, totals in monthly_sessions)
 
     # 2. Sessions the user has attended
-    sessions_attended = AttendanceRecord.query.filter_by(
-        user_id=user.id
-    ).count()
+    sessions_attended = user.sessions_attended
 
     # 3. Attendance rate
     attendance_rate = (
@@ -293,30 +316,25 @@ def get_user_attendance_summary():
     ]
 
     # 5. Monthly progress (how much user attended vs how many sessions were held)
-    monthly_sessions = db.session.query(
+    # bucketed by session date, like the rollup
+    monthly_attended = db.session.query(
         extract('year', AttendanceSession.date).label('year'),
         extract('month', AttendanceSession.date).label('month'),
-        func.count(AttendanceSession.id).label('total_sessions')
-    ).filter(
-        AttendanceSession.organization_id == user.organization_id
-    ).group_by('year', 'month').order_by('year', 'month').all()
-
-    monthly_attended = db.session.query(
-        extract('year', AttendanceRecord.timestamp).label('year'),
-        extract('month', AttendanceRecord.timestamp).label('month'),
         func.count(AttendanceRecord.id).label('attended_sessions')
+    ).join(
+        AttendanceSession, AttendanceRecord.session_id == AttendanceSession.id
     ).filter(
         AttendanceRecord.user_id == user.id
-    ).group_by('year', 'month').order_by('year', 'month').all()
+    ).group_by('year', 'month').all()
 
-    attended_lookup = {(row.year, row.month): row.attended_sessions for row in monthly_attended}
+    attended_lookup = {(int(row.year), int(row.month)): row.attended_sessions for row in monthly_attended}
 
     monthly_progress = []
-    for month in monthly_sessions:
-        attended = attended_lookup.get((month.year, month.month), 0)
-        rate = (attended / month.total_sessions) * 100 if month.total_sessions > 0 else 0
+    for year, month, totals in monthly_sessions:
+        attended = attended_lookup.get((year, month), 0)
+        rate = (attended / totals.sessions) * 100 if totals.sessions > 0 else 0
         monthly_progress.append({
-            "month": f"{int(month.year)}-{int(month.month):02d}",
+            "month": f"{year}-{month:02d}",
             "attendance_rate": round(rate, 2)
         })
 
@@ -334,3 +352,65 @@ def get_user_attendance_summary():
         "recent_attendance": recent_attendance,
         "monthly_progress": monthly_progress
     })
+
+
+# Face samples: extra enrollment photos, compacted into a few representatives
+@user_bp.route("/<int:id>/faces", methods=["GET"])
+@jwt_required()
+def list_face_samples(id):
+    user = User.query.get(id)
+    if not user or not can_manage_user(User.query.get(int(get_jwt_identity())), user):
+        return jsonify({"message": "User not found or not in your organization."}), 404
+
+    samples = FaceSample.query.filter_by(user_id=user.id, model_version=FACE_MODEL_VERSION) \
+        .order_by(FaceSample.id).all()
+    reps = FaceEncoding.query.filter_by(user_id=user.id, model_version=FACE_MODEL_VERSION) \
+        .order_by(FaceEncoding.slot).all()
+    return jsonify({
+        "samples": [s.to_dict() for s in samples],
+        "representatives": [{"slot": r.slot, "source_image": r.source_image} for r in reps],
+        "max_samples": MAX_SAMPLES_PER_USER,
+    }), 200
+
+
+@user_bp.route("/<int:id>/faces", methods=["POST"])
+@jwt_required()
+def add_face_samples(id):
+    """Add photos (multipart `files`) as extra samples; each is enrolled by a background job."""
+    user = User.query.get(id)
+    if not user or not can_manage_user(User.query.get(int(get_jwt_identity())), user):
+        return jsonify({"message": "User not found or not in your organization."}), 404
+
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({"message": "No files provided."}), 400
+    stored = FaceSample.query.filter_by(user_id=user.id, model_version=FACE_MODEL_VERSION).count()
+    pending = EnrollmentJob.query.filter(
+        EnrollmentJob.user_id == user.id, EnrollmentJob.kind == "sample",
+        EnrollmentJob.status.in_([EnrollmentStatusEnum.QUEUED, EnrollmentStatusEnum.PROCESSING])).count()
+    if stored + pending + len(files) > MAX_SAMPLES_PER_USER:
+        return jsonify({"message": f"At most {MAX_SAMPLES_PER_USER} face samples per user."}), 400
+
+    try:
+        urls = [save_upload(f) for f in files]
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    jobs = [queue_enrollment(user, image_url=url) for url in urls]
+    return jsonify({"jobs": [{"job_id": j.id, "image_url": j.image_url} for j in jobs]}), 202
+
+
+@user_bp.route("/<int:id>/faces/<int:sample_id>", methods=["DELETE"])
+@jwt_required()
+def delete_face_sample(id, sample_id):
+    user = User.query.get(id)
+    if not user or not can_manage_user(User.query.get(int(get_jwt_identity())), user):
+        return jsonify({"message": "User not found or not in your organization."}), 404
+    sample = FaceSample.query.filter_by(id=sample_id, user_id=user.id).first()
+    if not sample:
+        return jsonify({"message": "Face sample not found."}), 404
+
+    db.session.delete(sample)
+    reps = refresh_representatives(user.id)
+    db.session.commit()
+    cache_representatives(user, reps)
+    return jsonify({"message": "Face sample deleted.", "representatives": len(reps)}), 200
@@ -0,0 +1,194 @@
+from collections import Counter, defaultdict
+
+import sqlite3
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.engine import make_url
+
+from config import db
+from models import AttendanceDaily, AttendanceRecord, AttendanceSession, AttendanceStatusEnum, User
+
+# Materialized attendance counts: AttendanceSession.attendee_count,
+# User.sessions_attended and the AttendanceDaily rollup. Every insert or
+# delete of sessions and attendance records calls one of these in the same
+# transaction, and repair_counters() recomputes all three from the source
+# tables if they ever drift. sessions_attended only counts records of held
+# (not scheduled) sessions, so status changes out of SCHEDULED call
+# count_held_sessions() as well.
+
+
+# Databases with INSERT ... ON CONFLICT ... RETURNING, which the attendance
+# writer and the daily rollup rely on (SQLite from 3.35)
+UPSERT_DIALECTS = ("postgresql", "sqlite")
+MIN_SQLITE_VERSION = (3, 35)
+
+
+def check_upsert_support(app):
+    """Raise at startup, rather than on the first attendance write, if the database cannot upsert."""
+    backend = make_url(app.config["SQLALCHEMY_DATABASE_URI"]).get_backend_name()
+    if backend not in UPSERT_DIALECTS:
+        raise RuntimeError(f"Unsupported database {backend!r} in DATABASE_URL; "
+                           f"attendance needs one of {', '.join(UPSERT_DIALECTS)}")
+    if backend == "sqlite" and sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old for attendance upserts; "
+                           f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required")
+
+
+def dialect_insert(table):
+    """INSERT construct with ON CONFLICT support for the current database."""
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_
+    else:
+        # anything else was rejected by check_upsert_support at startup
+        from sqlalchemy.dialects.sqlite import insert as insert_
+    return insert_(table)
+
+
+def _bump(column, ids: Counter, sign: int):
+    """column += n * sign for every id, one UPDATE per distinct n (usually one)."""
+    by_amount: dict[int, list[int]] = defaultdict(list)
+    for row_id, n in ids.items():
+        by_amount[n].append(row_id)
+    table = column.class_
+    for n, row_ids in by_amount.items():
+        db.session.execute(
+            update(table).where(table.id.in_(sorted(row_ids))).values({column: column + n * sign}),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def _daily_key(organization_id: int, day, location: str | None) -> tuple:
+    return organization_id, day, location or ""
+
+
+def _bump_daily(deltas: dict[tuple, dict[str, int]]):
+    """Upsert AttendanceDaily rows, adding each {column: delta} to the (org, day, location) key."""
+    deltas = {key: d for key, d in deltas.items() if key[1] is not None and any(d.values())}
+    if not deltas:
+        return
+    table = AttendanceDaily.__table__
+    rows = [{"organization_id": org, "day": day, "location": location,
+             "sessions": d.get("sessions", 0), "records": d.get("records", 0)}
+            for (org, day, location), d in sorted(deltas.items())]
+    stmt = dialect_insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["organization_id", "day", "location"],
+        set_={"sessions": table.c.sessions + stmt.excluded.sessions,
+              "records": table.c.records + stmt.excluded.records},
+    )
+    db.session.execute(stmt)
+
+
+def count_attendance(pairs, sign: int = 1):
+    """Apply newly inserted (sign=1) or deleted (sign=-1) (session_id, user_id) records."""
+    pairs = list(pairs)
+    if not pairs:
+        return
+    per_session = Counter(s for s, _ in pairs)
+    _bump(AttendanceSession.attendee_count, per_session, sign)
+
+    keys = db.session.query(AttendanceSession.id, AttendanceSession.organization_id,
+                            AttendanceSession.date, AttendanceSession.location, AttendanceSession.status) \
+        .filter(AttendanceSession.id.in_(per_session))
+    held: set[int] = set()
+    deltas: dict[tuple, dict[str, int]] = defaultdict(lambda: {"records": 0})
+    for session_id, org, day, location, status in keys:
+        deltas[_daily_key(org, day, location)]["records"] += per_session[session_id] * sign
+        if status != AttendanceStatusEnum.SCHEDULED:
+            held.add(session_id)
+    _bump(User.sessions_attended, Counter(u for s, u in pairs if s in held), sign)
+    _bump_daily(deltas)
+
+
+def count_held_sessions(session_ids, sign: int = 1):
+    """
+    Add (sign=1) or remove (sign=-1) the records of sessions leaving (or
+    re-entering) SCHEDULED to their users' sessions_attended. `session_ids`
+    is a list or a select of ids; call before changing the status.
+    """
+    attended = (select(func.count(AttendanceRecord.id))
+                .where(AttendanceRecord.user_id == User.id, AttendanceRecord.session_id.in_(session_ids))
+                .scalar_subquery())
+    attendees = select(AttendanceRecord.user_id).where(AttendanceRecord.session_id.in_(session_ids))
+    db.session.execute(
+        update(User).where(User.id.in_(attendees))
+        .values(sessions_attended=User.sessions_attended + attended * sign),
+        execution_options={"synchronize_session": False},
+    )
+
+
+def count_session(session: AttendanceSession):
+    """Add a newly created (flushed) session to the daily rollup."""
+    _bump_daily({_daily_key(session.organization_id, session.date, session.location): {"sessions": 1}})
+
+
+def forget_session(session: AttendanceSession):
+    """Uncount a session and its records everywhere; call before deleting it."""
+    if session.status != AttendanceStatusEnum.SCHEDULED:
+        count_held_sessions([session.id], sign=-1)
+    _bump_daily({_daily_key(session.organization_id, session.date, session.location):
+                 {"sessions": -1, "records": -session.attendee_count}})
+
+
+def forget_user(user_id: int):
+    """Uncount a user's records from their sessions; call before deleting them."""
+    sessions = select(AttendanceRecord.session_id).where(AttendanceRecord.user_id == user_id)
+    db.session.execute(
+        update(AttendanceSession).where(AttendanceSession.id.in_(sessions))
+        .values(attendee_count=AttendanceSession.attendee_count - 1),
+        execution_options={"synchronize_session": False},
+    )
+    per_day = db.session.query(AttendanceSession.organization_id, AttendanceSession.date,
+                               AttendanceSession.location, func.count(AttendanceRecord.id)) \
+        .join(AttendanceRecord, AttendanceRecord.session_id == AttendanceSession.id) \
+        .filter(AttendanceRecord.user_id == user_id) \
+        .group_by(AttendanceSession.organization_id, AttendanceSession.date, AttendanceSession.location)
+    deltas: dict[tuple, dict[str, int]] = defaultdict(lambda: {"records": 0})
+    for org, day, location, n in per_day:
+        deltas[_daily_key(org, day, location)]["records"] -= n
+    _bump_daily(deltas)
+
+
+def rebuild_daily(organization_id: int | None = None) -> int:
+    """Recreate AttendanceDaily rows from the sessions' attendee counts; returns rows written."""
+    location = func.coalesce(AttendanceSession.location, "")
+    grouped = select(AttendanceSession.organization_id, AttendanceSession.date, location,
+                     func.count(AttendanceSession.id), func.sum(AttendanceSession.attendee_count)) \
+        .where(AttendanceSession.date.isnot(None)) \
+        .group_by(AttendanceSession.organization_id, AttendanceSession.date, location)
+    clear = delete(AttendanceDaily)
+    if organization_id is not None:
+        grouped = grouped.where(AttendanceSession.organization_id == organization_id)
+        clear = clear.where(AttendanceDaily.organization_id == organization_id)
+    db.session.execute(clear, execution_options={"synchronize_session": False})
+    table = AttendanceDaily.__table__
+    return db.session.execute(insert(table).from_select(
+        ["organization_id", "day", "location", "sessions", "records"], grouped)).rowcount
+
+
+def repair_counters(organization_id: int | None = None) -> tuple[int, int, int]:
+    """
+    Recompute the session and user counters from attendance_record (users
+    from records of held sessions only), touching only rows that drifted, then rebuild the daily rollup.
+    Returns (sessions fixed, users fixed, daily rows); the caller commits.
+    """
+    attendees = (select(func.count(AttendanceRecord.id))
+                 .where(AttendanceRecord.session_id == AttendanceSession.id).scalar_subquery())
+    sessions = update(AttendanceSession).where(AttendanceSession.attendee_count != attendees) \
+        .values(attendee_count=attendees)
+
+    attended = (select(func.count(AttendanceRecord.id))
+                .join(AttendanceSession, AttendanceRecord.session_id == AttendanceSession.id)
+                .where(AttendanceRecord.user_id == User.id,
+                       AttendanceSession.status != AttendanceStatusEnum.SCHEDULED)
+                .scalar_subquery())
+    users = update(User).where(User.sessions_attended != attended).values(sessions_attended=attended)
+
+    if organization_id is not None:
+        sessions = sessions.where(AttendanceSession.organization_id == organization_id)
+        users = users.where(User.organization_id == organization_id)
+    options = {"synchronize_session": False}
+    return (db.session.execute(sessions, execution_options=options).rowcount,
+            db.session.execute(users, execution_options=options).rowcount,
+            rebuild_daily(organization_id))
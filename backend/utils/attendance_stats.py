@@ -0,0 +1,107 @@
+from datetime import date
+from typing import NamedTuple
+
+from sqlalchemy import extract, func
+
+from config import db
+from models import AttendanceDaily, AttendanceRecord, AttendanceSession, AttendanceStatusEnum, User
+
+# Attendance counts shared by the summary, stats, session list and
+# time-series endpoints. Whole-history session and org counts come from the
+# materialized counters and per-day figures from the AttendanceDaily rollup
+# (see utils.attendance_counters); per-user attendance of held sessions
+# within a date range is a grouped query.
+# Each function costs a fixed number of queries however many users,
+# sessions and records the organization has.
+
+
+class OrgTotals(NamedTuple):
+    users: int
+    sessions: int
+    records: int
+
+
+def held_sessions(organization_id: int, start: date | None = None, end: date | None = None):
+    """Query of the ids of an org's sessions that count towards attendance (not still scheduled)."""
+    query = db.session.query(AttendanceSession.id).filter(
+        AttendanceSession.organization_id == organization_id,
+        AttendanceSession.status != AttendanceStatusEnum.SCHEDULED,
+    )
+    if start:
+        query = query.filter(AttendanceSession.date >= start)
+    if end:
+        query = query.filter(AttendanceSession.date <= end)
+    return query
+
+
+def org_totals(organization_id: int) -> OrgTotals:
+    """User, session and record counts of an org in one round-trip."""
+    users = (db.session.query(func.count(User.id))
+             .filter(User.organization_id == organization_id).scalar_subquery())
+    sessions = (db.session.query(func.count(AttendanceSession.id))
+                .filter(AttendanceSession.organization_id == organization_id).scalar_subquery())
+    records = (db.session.query(func.coalesce(func.sum(AttendanceSession.attendee_count), 0))
+               .filter(AttendanceSession.organization_id == organization_id).scalar_subquery())
+    return OrgTotals(*db.session.query(users, sessions, records).one())
+
+
+def users_with_attendance(organization_id: int, start: date | None = None, end: date | None = None,
+                          user_ids: list[int] | None = None) -> tuple[int, list[tuple[User, int]]]:
+    """
+    (number of held sessions, [(user, sessions attended)]) for an org's
+    users, optionally limited to `user_ids` and to sessions dated within
+    [start, end]. Only records of held sessions count, so attendance taken
+    before a session starts never pushes a percentage past 100. Without a
+    date range this reads User.sessions_attended; a range needs a grouped
+    query over that range's held sessions.
+    """
+    held = held_sessions(organization_id, start, end).subquery()
+    total = db.session.query(func.count()).select_from(held).scalar()
+
+    query = User.query.filter(User.organization_id == organization_id)
+    if user_ids is not None:
+        query = query.filter(User.id.in_(user_ids))
+    if start is None and end is None:
+        query = query.add_columns(User.sessions_attended)
+    else:
+        attended = (db.session.query(AttendanceRecord.user_id,
+                                     func.count(AttendanceRecord.id).label("attended"))
+                    .join(held, AttendanceRecord.session_id == held.c.id))
+        if user_ids is not None:
+            attended = attended.filter(AttendanceRecord.user_id.in_(user_ids))
+        attended = attended.group_by(AttendanceRecord.user_id).subquery()
+        query = (query.outerjoin(attended, User.id == attended.c.user_id)
+                 .add_columns(func.coalesce(attended.c.attended, 0)))
+    return total, query.order_by(User.id).all()
+
+
+class DailyTotals(NamedTuple):
+    sessions: int
+    records: int
+
+
+def daily_attendance(organization_id: int, start: date, end: date,
+                     location: str | None = None) -> dict[date, DailyTotals]:
+    """Rollup totals per day in [start, end], summed over locations unless one is given; empty days are omitted."""
+    query = (db.session.query(AttendanceDaily.day, func.sum(AttendanceDaily.sessions), func.sum(AttendanceDaily.records))
+             .filter(AttendanceDaily.organization_id == organization_id,
+                     AttendanceDaily.day >= start, AttendanceDaily.day <= end))
+    if location is not None:
+        query = query.filter(AttendanceDaily.location == location)
+    return {day: DailyTotals(int(sessions), int(records))
+            for day, sessions, records in query.group_by(AttendanceDaily.day)}
+
+
+def monthly_attendance(organization_id: int) -> list[tuple[int, int, DailyTotals]]:
+    """(year, month, totals) for every month an org held sessions, oldest first."""
+    year = extract('year', AttendanceDaily.day).label('year')
+    month = extract('month', AttendanceDaily.day).label('month')
+    rows = (db.session.query(year, month, func.sum(AttendanceDaily.sessions), func.sum(AttendanceDaily.records))
+            .filter(AttendanceDaily.organization_id == organization_id)
+            .group_by(year, month).order_by(year, month))
+    return [(int(y), int(m), DailyTotals(int(sessions), int(records)))
+            for y, m, sessions, records in rows if sessions]
+
+
+def percentage(part: int, whole: int) -> float:
+    return round((part / whole) * 100, 2) if whole else 0.0
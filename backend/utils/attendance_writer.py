@@ -0,0 +1,192 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from models import AttendanceRecord
+from utils.attendance_counters import check_upsert_support, count_attendance, dialect_insert
+from utils.metrics import stage_timer
+
+log = logging.getLogger(__name__)
+
+_writer: "AttendanceWriter | None" = None
+_writer_lock = threading.Lock()
+
+MAX_ATTEMPTS = 3
+
+
+def _insert_ignore_duplicates(rows: list[dict]) -> list[tuple[int, int]]:
+    """
+    Bulk INSERT that skips rows hitting unique_attendance_record. Returns
+    the (session_id, user_id) pairs actually inserted.
+    """
+    table = AttendanceRecord.__table__
+    stmt = dialect_insert(table).values(rows) \
+        .on_conflict_do_nothing(index_elements=["session_id", "user_id"]) \
+        .returning(table.c.session_id, table.c.user_id)
+    return [tuple(row) for row in db.session.execute(stmt)]
+
+
+class AttendanceWriter:
+    """
+    Write-behind buffer for attendance produced by recognition. Callers
+    enqueue (session, user) pairs and return immediately; a background
+    thread inserts them in batches once `max_batch` rows are waiting or
+    `max_delay` seconds have passed, and on shutdown. Pairs stay pending
+    until their batch is committed or dropped, so callers checking the
+    database for existing attendance can also ask the writer.
+    """
+
+    def __init__(self, app, max_batch: int = 50, max_delay: float = 1.0):
+        self.app = app
+        self.max_batch = max(1, max_batch)
+        self.max_delay = max_delay
+        self._buffer: list[dict] = []
+        self._pending: set[tuple[int, int]] = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self.flushed = 0
+
+    def start(self) -> "AttendanceWriter":
+        with self._cond:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="attendance-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def record(self, session_id: int, user_id: int) -> bool:
+        """Queue a pair; returns False if it is already waiting to be written."""
+        if self._thread is None:
+            self.start()
+        with self._cond:
+            if (session_id, user_id) in self._pending:
+                return False
+            self._pending.add((session_id, user_id))
+            self._buffer.append({
+                "session_id": session_id,
+                "user_id": user_id,
+                "timestamp": datetime.now(timezone.utc),
+                "_attempts": 0,
+            })
+            if len(self._buffer) >= self.max_batch:
+                self._cond.notify()
+            closed = self._closed
+        if closed:
+            # the background thread is gone or about to be; write it now
+            self.flush()
+        return True
+
+    def _settle(self, batch: list[dict]):
+        """Forget rows that were committed or dropped."""
+        with self._cond:
+            self._pending.difference_update((r["session_id"], r["user_id"]) for r in batch)
+
+    def _take(self) -> list[dict]:
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        return batch
+
+    def flush(self):
+        """Write everything buffered so far; failed rows are retried on the next flush."""
+        batch = self._take()
+        if not batch:
+            return
+        with self.app.app_context():
+            self._write(batch)
+
+    def _write(self, batch: list[dict]):
+        rows = [{k: v for k, v in r.items() if not k.startswith("_")} for r in batch]
+        try:
+            with stage_timer("db_write"):
+                count_attendance(_insert_ignore_duplicates(rows))
+                db.session.commit()
+            self._settle(batch)
+            self.flushed += len(rows)
+            log.debug("Flushed %d attendance records", len(rows))
+        except IntegrityError:
+            # a session or user deleted while its rows were buffered; halve
+            # the batch until the offending rows are on their own
+            db.session.rollback()
+            if len(batch) == 1:
+                log.warning("Dropped attendance of user %s in session %s: it no longer exists",
+                            rows[0]["user_id"], rows[0]["session_id"])
+                self._settle(batch)
+                return
+            mid = len(batch) // 2
+            self._write(batch[:mid])
+            self._write(batch[mid:])
+        except Exception:
+            db.session.rollback()
+            log.exception("Failed to flush %d attendance records", len(rows))
+            retry = [r for r in batch if r["_attempts"] + 1 < MAX_ATTEMPTS]
+            if len(retry) < len(batch):
+                dropped = [r for r in batch if r["_attempts"] + 1 >= MAX_ATTEMPTS]
+                self._log_dropped(dropped, f"after {MAX_ATTEMPTS} attempts")
+                self._settle(dropped)
+            for r in retry:
+                r["_attempts"] += 1
+            with self._cond:
+                self._buffer[:0] = retry
+
+    @staticmethod
+    def _log_dropped(batch: list[dict], reason: str):
+        log.error("Dropped %d attendance records %s: %s", len(batch), reason,
+                  ", ".join(f"(session {r['session_id']}, user {r['user_id']})" for r in batch))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.max_delay
+                while not self._closed and len(self._buffer) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def shutdown(self):
+        """Flush what is left and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        # rows requeued by a failed final flush get their remaining attempts
+        for _ in range(MAX_ATTEMPTS):
+            with self._cond:
+                if not self._buffer:
+                    return
+            self.flush()
+        left = self._take()
+        if left:
+            self._log_dropped(left, "at shutdown")
+            self._settle(left)
+
+
+def init_attendance_writer(app):
+    global _writer
+    check_upsert_support(app)
+    with _writer_lock:
+        if _writer is None:
+            _writer = AttendanceWriter(
+                app,
+                max_batch=app.config["ATTENDANCE_FLUSH_SIZE"],
+                max_delay=app.config["ATTENDANCE_FLUSH_INTERVAL"],
+            )
+            atexit.register(_writer.shutdown)
+    return _writer
+
+
+def get_attendance_writer() -> AttendanceWriter:
+    if _writer is None:
+        raise RuntimeError("Attendance writer not initialised; call init_attendance_writer(app)")
+    return _writer
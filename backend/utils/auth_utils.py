@@ -24,3 +24,12 @@ def generate_jwt_tokens(user):
     )
 
     return access_token, refresh_token
+
+
+def can_manage_user(requester, target) -> bool:
+    """The user themselves, or a supervisor/admin of the same organization."""
+    if requester is None:
+        return False
+    if requester.id == target.id:
+        return True
+    return requester.role in ("admin", "supervisor") and requester.organization_id == target.organization_id
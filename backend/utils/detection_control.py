@@ -0,0 +1,79 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+# (detection width, HOG upsample) in increasing order of cost. Upsampling
+# roughly quadruples detection time but halves the smallest findable face.
+DETECTION_LADDER = [
+    (240, 0),
+    (320, 0),
+    (480, 0),
+    (640, 0),
+    (480, 1),
+    (640, 1),
+]
+DEFAULT_LEVEL = 1  # 320px, no upsample: the historical fixed setting
+# dlib's HOG detector scans an 80x80 window, so at upsample 0 it misses
+# faces much under 80px; step up while the smallest face is below this
+SMALL_FACE_PX = 80
+# Faces this big at detection resolution can be found on a smaller image
+LARGE_FACE_PX = 140
+EMA_ALPHA = 0.2
+# Observations between two changes, so a single slow frame does not flap the level
+COOLDOWN = 15
+
+
+class DetectionScaleController:
+    """
+    Picks the detection resolution and HOG upsample factor for one camera
+    from measured detection time and observed face sizes: step down when
+    over the frame budget or when faces are large, step up when there is
+    headroom and faces are small (or none are being found).
+    """
+
+    def __init__(self, budget_ms: float, name: str = "camera", level: int = DEFAULT_LEVEL):
+        self.budget_ms = budget_ms
+        self.name = name
+        self.level = max(0, min(level, len(DETECTION_LADDER) - 1))
+        self.avg_ms: float | None = None
+        self._since_change = 0
+
+    @property
+    def width(self) -> int:
+        return DETECTION_LADDER[self.level][0]
+
+    @property
+    def upsample(self) -> int:
+        return DETECTION_LADDER[self.level][1]
+
+    def size_for(self, frame_shape) -> tuple[int, int]:
+        """(width, height) to resize a frame to, keeping its aspect ratio."""
+        h, w = frame_shape[:2]
+        width = min(self.width, w)
+        return width, max(1, round(h * width / w))
+
+    def observe(self, elapsed_ms: float, face_heights: list[float]):
+        """Feed one detection: its duration and face heights in detection pixels."""
+        self.avg_ms = elapsed_ms if self.avg_ms is None else \
+            EMA_ALPHA * elapsed_ms + (1 - EMA_ALPHA) * self.avg_ms
+        self._since_change += 1
+        if self._since_change < COOLDOWN:
+            return
+
+        smallest = min(face_heights) if face_heights else None
+        if self.avg_ms > self.budget_ms:
+            self._move(-1, "over budget")
+        elif smallest is not None and smallest > LARGE_FACE_PX:
+            self._move(-1, "faces are large")
+        elif self.avg_ms < self.budget_ms * 0.5 and (smallest is None or smallest < SMALL_FACE_PX):
+            # scaling up quadruples cost at most; only do it with real headroom
+            self._move(+1, "small or no faces with headroom")
+
+    def _move(self, step: int, reason: str):
+        level = max(0, min(self.level + step, len(DETECTION_LADDER) - 1))
+        if level == self.level:
+            return
+        self.level = level
+        self._since_change = 0
+        log.info("%s: detection at %dpx upsample=%d (%s, avg %.1fms, budget %.0fms)",
+                 self.name, self.width, self.upsample, reason, self.avg_ms, self.budget_ms)
@@ -0,0 +1,168 @@
+import os
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+_pool: "EncodingPool | None" = None
+_pool_lock = threading.Lock()
+
+# Each worker holds its own copy of the dlib models, and every gunicorn
+# worker has its own pool, so keep this small
+DEFAULT_WORKERS = 2
+# Workers never fork from the threaded app process: forkserver where
+# available (POSIX), spawn elsewhere
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_worker():
+    """Runs once per worker: load the dlib models and push one dummy face through them."""
+    import face_recognition
+    blank = np.zeros((150, 150, 3), dtype=np.uint8)
+    face_recognition.face_locations(blank)
+    face_recognition.face_encodings(blank, [(25, 125, 125, 25)])
+
+
+def _ping():
+    return os.getpid()
+
+
+class EncodingPool:
+    """
+    Process-wide pool of face-encoding workers. Workers load the models once
+    in their initializer and are reused by enrollment and batch jobs, instead
+    of paying the dlib start-up cost on every call.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self.warmup_seconds: float | None = None
+
+    def _current_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(START_METHOD),
+                    initializer=_init_worker,
+                )
+            return self._executor
+
+    def start(self) -> "EncodingPool":
+        """Spawn and warm every worker; blocks until they are ready."""
+        with self._lock:
+            if self._executor is not None:
+                return self
+        started = time.perf_counter()
+        executor = self._current_executor()
+        # one task per worker forces the executor to spawn all of them now
+        pids = {f.result() for f in [executor.submit(_ping) for _ in range(self.max_workers)]}
+        self.warmup_seconds = time.perf_counter() - started
+        log.info("Encoding pool warmed %d workers in %.2fs", len(pids), self.warmup_seconds)
+        return self
+
+    def _on_done(self, _future):
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+
+    def _replace_broken(self, executor: ProcessPoolExecutor):
+        """Drop an executor whose worker died; the next submit builds a fresh one."""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+        log.warning("Encoding worker died; restarting the pool")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, outer: Future, fn, args, retries: int):
+        executor = self._current_executor()
+        try:
+            inner = executor.submit(fn, *args)
+        except RuntimeError as e:  # BrokenProcessPool, or the pool was shut down
+            inner = Future()
+            inner.set_exception(e)
+        inner.add_done_callback(lambda f: self._settle(outer, f, executor, fn, args, retries))
+
+    def _settle(self, outer: Future, inner: Future, executor, fn, args, retries: int):
+        if outer.done():
+            return
+        if inner.cancelled():
+            outer.cancel()
+            return
+        error = inner.exception()
+        if isinstance(error, BrokenProcessPool) and retries > 0:
+            # a dlib crash or OOM kill takes the whole executor down; rebuild
+            # it and run the task once more
+            self._replace_broken(executor)
+            self._dispatch(outer, fn, args, retries - 1)
+        elif error is not None:
+            if isinstance(error, BrokenProcessPool):
+                self._replace_broken(executor)
+            outer.set_exception(error)
+        else:
+            outer.set_result(inner.result())
+
+    def submit(self, fn, *args) -> Future:
+        if self._executor is None:
+            self.start()
+        outer = Future()
+        with self._lock:
+            self._pending += 1
+        outer.add_done_callback(self._on_done)
+        self._dispatch(outer, fn, args, retries=1)
+        return outer
+
+    def map(self, fn, iterable):
+        """Like Executor.map, but through submit() so queue depth is tracked."""
+        futures = [self.submit(fn, item) for item in iterable]
+        for future in futures:
+            yield future.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "started": self._executor is not None,
+                "queue_depth": self._pending,
+                "completed": self._completed,
+                "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            }
+
+    def shutdown(self, wait: bool = True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+            log.info("Encoding pool shut down")
+
+
+def init_encoding_pool(app):
+    """Configure the process-wide pool from app config (workers start lazily)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = EncodingPool(app.config["ENCODING_WORKERS"])
+            atexit.register(_pool.shutdown)
+    return _pool
+
+
+def get_encoding_pool() -> EncodingPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # outside an app factory (CLI scripts, benchmarks)
+            _pool = EncodingPool(int(os.getenv("ENCODING_WORKERS", DEFAULT_WORKERS)))
+            atexit.register(_pool.shutdown)
+        return _pool
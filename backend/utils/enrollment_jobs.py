@@ -0,0 +1,213 @@
+import atexit
+import logging
+import threading
+from concurrent.futures import as_completed
+from datetime import datetime, timedelta, timezone
+
+from config import db
+from models import EnrollmentJob, EnrollmentStatusEnum, User
+from utils.encoding_pool import get_encoding_pool
+from utils.face_utils import (
+    _encode_enrollment_image, _extract_filename, store_face_sample, drop_primary_sample,
+    refresh_representatives, cache_representatives,
+)
+
+log = logging.getLogger(__name__)
+
+_runner: "EnrollmentRunner | None" = None
+_runner_lock = threading.Lock()
+
+# Jobs left PROCESSING this long (a process died mid-batch) are queued again
+STALE_AFTER = timedelta(minutes=10)
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+class EnrollmentRunner:
+    """
+    Background enrollment: a thread claims QUEUED EnrollmentJob rows in
+    batches, encodes them on the encoding pool and stores the results. The
+    table is the queue, so jobs survive restarts and whichever app process
+    claims a row first runs it; notify() only wakes this process early.
+    """
+
+    def __init__(self, app, batch_size: int = 8, poll_interval: float = 5.0):
+        self.app = app
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> "EnrollmentRunner":
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="enrollment-runner", daemon=True)
+        with self.app.app_context():
+            requeued = EnrollmentJob.query.filter(
+                EnrollmentJob.status == EnrollmentStatusEnum.PROCESSING,
+                EnrollmentJob.started_at < _now() - STALE_AFTER,
+            ).update({"status": EnrollmentStatusEnum.QUEUED, "stage": "queued"}, synchronize_session=False)
+            db.session.commit()
+        if requeued:
+            log.warning("Requeued %d stale enrollment jobs", requeued)
+        self._thread.start()
+        return self
+
+    def notify(self):
+        if self._thread is None:
+            self.start()
+        self._wake.set()
+
+    def _claim(self) -> list[EnrollmentJob]:
+        """Mark up to batch_size queued jobs as ours; rows another process got first are skipped."""
+        candidates = [jid for (jid,) in db.session.query(EnrollmentJob.id)
+                      .filter(EnrollmentJob.status == EnrollmentStatusEnum.QUEUED)
+                      .order_by(EnrollmentJob.id).limit(self.batch_size)]
+        claimed = []
+        for jid in candidates:
+            won = EnrollmentJob.query.filter_by(id=jid, status=EnrollmentStatusEnum.QUEUED).update(
+                {"status": EnrollmentStatusEnum.PROCESSING, "stage": "encoding", "started_at": _now()},
+                synchronize_session=False)
+            if won:
+                claimed.append(jid)
+        db.session.commit()
+        return EnrollmentJob.query.filter(EnrollmentJob.id.in_(claimed)).all() if claimed else []
+
+    def run_once(self) -> int:
+        """Claim and finish one batch; returns the number of jobs handled."""
+        with self.app.app_context():
+            jobs = self._claim()
+            if not jobs:
+                return 0
+            pool = get_encoding_pool()
+            futures = {pool.submit(_encode_enrollment_image, (job.id, _extract_filename(job.image_url))): job
+                       for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    _, encoding, error = future.result()
+                except Exception:
+                    log.exception("Enrollment worker failed on job %s", futures[future].id)
+                    encoding, error = None, "Encoding failed."
+                self._finish(futures[future], encoding, error)
+            return len(jobs)
+
+    def _finish(self, job: EnrollmentJob, encoding, error: str | None):
+        user = db.session.get(User, job.user_id)
+        changed, reps = False, None
+        try:
+            job.stage = "storing"
+            if user is None:
+                error = error or "User no longer exists."
+            elif job.kind == "profile" and user.image_url != job.image_url:
+                error = error or "Superseded by a newer image."
+            elif error is None:
+                store_face_sample(user.id, encoding, job.image_url, primary=job.kind == "profile")
+                changed = True
+            elif job.kind == "profile":
+                # the user's current photo is unusable: do not keep matching the old one
+                drop_primary_sample(user.id)
+                changed = True
+            if changed:
+                reps = refresh_representatives(user.id)
+            job.status = EnrollmentStatusEnum.FAILED if error else EnrollmentStatusEnum.DONE
+            job.stage = "done"
+            job.error = error
+            job.finished_at = _now()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            log.exception("Failed to store enrollment job %s", job.id)
+            EnrollmentJob.query.filter_by(id=job.id).update({
+                "status": EnrollmentStatusEnum.FAILED, "stage": "done",
+                "error": "Could not store encoding.", "finished_at": _now(),
+            }, synchronize_session=False)
+            db.session.commit()
+            self.failed += 1
+            return
+
+        if changed:
+            cache_representatives(user, reps)
+        if error:
+            self.failed += 1
+            log.warning("Enrollment job %s for user %s failed: %s", job.id, job.user_id, error)
+        else:
+            self.completed += 1
+
+    def _run(self):
+        while not self._closed:
+            try:
+                handled = self.run_once()
+            except Exception:
+                log.exception("Enrollment runner iteration failed")
+                handled = 0
+            if not handled:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def stats(self) -> dict:
+        return {"running": self._thread is not None, "completed": self.completed, "failed": self.failed}
+
+    def shutdown(self):
+        """Stop after the current batch; unclaimed jobs stay queued for the next start."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+
+
+def queue_enrollment(user: User, image_url: str | None = None) -> EnrollmentJob | None:
+    """
+    Queue a background enrollment and commit. Without image_url the user's
+    current image_url is (re-)enrolled as their primary sample, and a user
+    without an image loses it instead; with image_url that photo is added
+    as an extra sample.
+    """
+    if image_url is None and not user.image_url:
+        drop_primary_sample(user.id)
+        reps = refresh_representatives(user.id)
+        db.session.commit()
+        cache_representatives(user, reps)
+        return None
+    if image_url is None:
+        job = EnrollmentJob(user_id=user.id, image_url=user.image_url, kind="profile")
+    else:
+        job = EnrollmentJob(user_id=user.id, image_url=image_url, kind="sample")
+    db.session.add(job)
+    db.session.commit()
+    get_enrollment_runner().notify()
+    return job
+
+
+def queue_position(job: EnrollmentJob) -> int | None:
+    """Queued jobs ahead of this one, or None once it has been picked up."""
+    if job.status != EnrollmentStatusEnum.QUEUED:
+        return None
+    return EnrollmentJob.query.filter(
+        EnrollmentJob.status == EnrollmentStatusEnum.QUEUED, EnrollmentJob.id < job.id).count()
+
+
+def init_enrollment_runner(app):
+    """Configure the process-wide runner (its thread starts on first use or from gunicorn.conf.py)."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = EnrollmentRunner(
+                app,
+                batch_size=app.config["ENROLLMENT_BATCH_SIZE"],
+                poll_interval=app.config["ENROLLMENT_POLL_INTERVAL"],
+            )
+            atexit.register(_runner.shutdown)
+    return _runner
+
+
+def get_enrollment_runner() -> EnrollmentRunner:
+    if _runner is None:
+        raise RuntimeError("Enrollment runner not initialised; call init_enrollment_runner(app)")
+    return _runner
@@ -0,0 +1,112 @@
+import itertools
+
+import numpy as np
+
+# Detections overlapping a track's predicted box by at least this IoU continue it
+IOU_THRESHOLD = 0.3
+# Detection rounds a track survives without a matching detection
+MAX_MISSES = 2
+# Confirmed tracks are re-encoded every N detection rounds to catch swaps
+REVERIFY_EVERY = 30
+# Weight of the newest observation in the velocity estimate
+VELOCITY_SMOOTHING = 0.5
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU between (top, right, bottom, left) boxes, shape (len(a), len(b))."""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)))
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(bottom - top, 0, None) * np.clip(right - left, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 1] - a[:, 3])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 1] - b[:, 3])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+class Track:
+    def __init__(self, track_id: int, box: np.ndarray, t: float):
+        self.id = track_id
+        self.box = box
+        self.velocity = np.zeros(4)  # px/s per box edge
+        self.t = t
+        self.user_id = None
+        self.name = "Unknown"
+        self.misses = 0
+        self.rounds_since_encode = 0
+
+    @property
+    def confirmed(self) -> bool:
+        return self.user_id is not None
+
+    @property
+    def needs_encoding(self) -> bool:
+        return not self.confirmed or self.rounds_since_encode >= REVERIFY_EVERY
+
+    def predict(self, t: float) -> np.ndarray:
+        return self.box + self.velocity * (t - self.t)
+
+    def observe(self, box: np.ndarray, t: float):
+        dt = t - self.t
+        if dt > 0:
+            self.velocity = (VELOCITY_SMOOTHING * (box - self.box) / dt
+                             + (1 - VELOCITY_SMOOTHING) * self.velocity)
+        self.box, self.t = box, t
+        self.misses = 0
+        self.rounds_since_encode += 1
+
+    def identify(self, user_id, name: str):
+        self.user_id, self.name = user_id, name
+        self.rounds_since_encode = 0
+
+
+class FaceTracker:
+    """
+    Greedy IoU tracker over detection rounds. Keeps a stable id and identity
+    per face so recognition only encodes new, unidentified or due-for-recheck
+    tracks, and exposes per-track velocity for drawing between detections.
+    """
+
+    def __init__(self):
+        self.tracks: list[Track] = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, t: float) -> list[tuple[Track, int]]:
+        """
+        Feed one detection round; returns (track, detection index) for every
+        detection, creating tracks for the unmatched ones.
+        """
+        dets = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        predicted = np.array([tr.predict(t) for tr in self.tracks]).reshape(-1, 4)
+        ious = iou_matrix(predicted, dets)
+
+        pairs, used_tracks, used_dets = [], set(), set()
+        for ti, di in sorted(np.argwhere(ious >= IOU_THRESHOLD), key=lambda p: -ious[p[0], p[1]]):
+            if ti in used_tracks or di in used_dets:
+                continue
+            self.tracks[ti].observe(dets[di], t)
+            pairs.append((self.tracks[ti], int(di)))
+            used_tracks.add(ti)
+            used_dets.add(di)
+
+        survivors = []
+        for ti, tr in enumerate(self.tracks):
+            if ti not in used_tracks:
+                tr.misses += 1
+                if tr.misses > MAX_MISSES:
+                    continue
+            survivors.append(tr)
+        for di in range(len(dets)):
+            if di not in used_dets:
+                tr = Track(next(self._ids), dets[di], t)
+                survivors.append(tr)
+                pairs.append((tr, di))
+        self.tracks = survivors
+        return pairs
+
+    def visible(self) -> list[Track]:
+        """Tracks seen in the latest round (missed ones are kept but not drawn)."""
+        return [tr for tr in self.tracks if tr.misses == 0]
@@ -1,21 +1,42 @@
 import os
 import time
 import logging
+import threading
 from urllib.parse import urlparse
-from concurrent.futures import ProcessPoolExecutor
 
 import cv2
+import numpy as np
 import face_recognition
 from config import UPLOAD_FOLDER, db
-from models import User
+from models import User, FaceEncoding, FaceSample
+from utils.gallery import Gallery, EMBEDDING_DIM, encoding_to_bytes, encoding_from_bytes, representatives
+from utils.encoding_pool import get_encoding_pool
+from utils.gallery_store import get_gallery_store
+from utils.metrics import GALLERY_CACHE_REQUESTS, GALLERY_LOAD_SECONDS
 
 log = logging.getLogger(__name__)
 
-# Cache: org_id -> { timestamp, data: (encodings, ids) }
+# Cache: org_id -> { checked, version, data: Gallery }. The galleries
+# themselves are memory-mapped from the GalleryStore, so every worker
+# shares one copy; this only tracks which published version is mapped.
 known_faces_cache: dict[int, dict] = {}
+_cache_lock = threading.Lock()
+# Enrollment, edits and deletes patch this worker's gallery immediately and
+# schedule a rebuild that all workers pick up (see update_cached_face /
+# remove_cached_face); the TTL rebuild is only a consistency check.
 CACHE_TTL = 24 * 3600  # 24h
-MAX_WORKERS = os.cpu_count() or 4
-THUMBNAIL_SIZE = (128, 128)
+# How often a worker looks for a version published by another worker (s)
+STORE_CHECK_INTERVAL = 1.0
+# Enrollment photos are downscaled (aspect preserved) to this longest side
+ENROLL_MAX_SIDE = 480
+# Pushed frames are downscaled to this longest side before HOG detection
+FRAME_MAX_SIDE = 640
+# Enrolled photos per user; matching cost depends on representatives, not on this
+MAX_SAMPLES_PER_USER = 10
+
+# Bump when the encoder or preprocessing changes; rows tagged with an older
+# version are ignored by load_known_faces and recomputed by backfill.
+FACE_MODEL_VERSION = "dlib_resnet_v1-480"
 
 # Helpers
 
@@ -23,52 +44,219 @@ def _extract_filename(url: str) -> str:
     return os.path.basename(urlparse(url).path)
 
 
-def _process_user_face(args):
-    """Loads image via cv2, resizes, and encodes face."""
-    user_id, image_fname = args
+def _encode_enrollment_image(args):
+    """
+    Decodes, normalises and encodes one enrollment photo. Runs in the
+    encoding pool; returns (key, encoding, None), or (key, None, reason)
+    when the photo is unreadable or does not show exactly one face.
+    """
+    key, image_fname = args
     file_path = os.path.join(UPLOAD_FOLDER, image_fname)
-    if not os.path.isfile(file_path):
-        return user_id, []
+    img = cv2.imread(file_path) if os.path.isfile(file_path) else None
+    if img is None:
+        return key, None, "Could not read image."
+    scale = min(1.0, ENROLL_MAX_SIDE / max(img.shape[:2]))
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    locs = face_recognition.face_locations(rgb)
+    if not locs:
+        return key, None, "No face found."
+    # an enrollment photo must belong to exactly one person
+    if len(locs) > 1:
+        return key, None, f"{len(locs)} faces found; the photo must show one person."
+    return key, face_recognition.face_encodings(rgb, locs)[0], None
+
 
-    img = cv2.imread(file_path)
+def detect_and_encode(image_bytes: bytes, max_side: int = FRAME_MAX_SIDE):
+    """
+    Decodes one pushed frame, detects and encodes its faces. Runs in the
+    encoding pool; returns (locations in original pixels, encodings) or
+    None if the bytes are not a decodable image.
+    """
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
     if img is None:
-        return user_id, []
-    # downsample
-    small = cv2.resize(img, THUMBNAIL_SIZE)
+        return None
+    scale = min(1.0, max_side / max(img.shape[:2]))
+    small = cv2.resize(img, None, fx=scale, fy=scale) if scale < 1.0 else img
     rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
-    encs = face_recognition.face_encodings(rgb)
-    return user_id, encs
+    locs = face_recognition.face_locations(rgb)
+    encs = face_recognition.face_encodings(rgb, locs)
+    locs = [tuple(int(v / scale) for v in loc) for loc in locs]
+    return locs, [np.asarray(e, dtype=np.float32) for e in encs]
+
+
+def store_face_sample(user_id: int, encoding, image_url: str | None, primary: bool = False) -> FaceSample:
+    """Add one photo's encoding for a user (no commit); a new primary sample replaces the old one."""
+    if primary:
+        drop_primary_sample(user_id)
+    row = FaceSample(user_id=user_id, image_url=image_url, is_primary=primary,
+                     model_version=FACE_MODEL_VERSION, encoding=encoding_to_bytes(encoding))
+    db.session.add(row)
+    return row
 
 
-def load_known_faces(organization_id: int, force_reload: bool = False):
+def drop_primary_sample(user_id: int):
+    FaceSample.query.filter_by(user_id=user_id, is_primary=True, model_version=FACE_MODEL_VERSION).delete()
+
+
+def refresh_representatives(user_id: int) -> np.ndarray:
     """
-    Returns (encodings, ids) for an org, using ProcessPool and cv2 for speed.
+    Recompute a user's representative rows from their current samples (no
+    commit). Returns the representative vectors, empty if no samples remain.
+    """
+    samples = FaceSample.query.filter_by(user_id=user_id, model_version=FACE_MODEL_VERSION) \
+        .order_by(FaceSample.id).all()
+    FaceEncoding.query.filter_by(user_id=user_id, model_version=FACE_MODEL_VERSION).delete()
+    if not samples:
+        return np.empty((0, EMBEDDING_DIM))
+    vectors, sources = representatives([encoding_from_bytes(s.encoding) for s in samples])
+    for slot, (vec, src) in enumerate(zip(vectors, sources)):
+        db.session.add(FaceEncoding(
+            user_id=user_id, model_version=FACE_MODEL_VERSION, slot=slot,
+            encoding=encoding_to_bytes(vec),
+            source_image=samples[src].image_url if src >= 0 else None,
+        ))
+    return vectors
+
+
+def cache_representatives(user: User, reps: np.ndarray):
+    """After committing refresh_representatives(), apply its result to the cached gallery."""
+    if len(reps):
+        update_cached_face(user.organization_id, user.id, reps)
+    else:
+        remove_cached_face(user.organization_id, user.id)
+
+
+def _gallery_from_db(organization_id: int) -> Gallery:
+    # One bulk fetch of stored vectors, no image decoding here
+    rows = db.session.query(FaceEncoding.user_id, FaceEncoding.slot, FaceEncoding.encoding) \
+        .join(User, User.id == FaceEncoding.user_id) \
+        .filter(User.organization_id == organization_id) \
+        .filter(FaceEncoding.model_version == FACE_MODEL_VERSION).all()
+    return Gallery.from_rows(rows)
+
+
+def _schedule_publish(organization_id: int):
+    get_gallery_store().schedule_publish(organization_id, lambda: _gallery_from_db(organization_id))
+
+
+def update_cached_face(organization_id: int, user_id: int, encodings):
+    """Add or replace one user's representatives in the cached org gallery, and republish it."""
+    with _cache_lock:
+        cache = known_faces_cache.get(organization_id)
+        if cache:
+            cache['data'] = cache['data'].replace(user_id, encodings)
+    _schedule_publish(organization_id)
+
+
+def remove_cached_face(organization_id: int, user_id: int):
+    """Drop one user's rows from the cached org gallery, and republish it."""
+    with _cache_lock:
+        cache = known_faces_cache.get(organization_id)
+        if cache:
+            cache['data'] = cache['data'].remove(user_id)
+    _schedule_publish(organization_id)
+
+
+def backfill_face_encodings(organization_id: int | None = None) -> int:
+    """
+    Encodes users whose image has no primary sample for FACE_MODEL_VERSION
+    (new rows, changed image_url, or an older model version), re-encodes
+    their extra photos stored under an older version, and recomputes their
+    representatives. Returns the number of samples written.
+    """
+    query = db.session.query(User.id, User.organization_id, User.image_url, FaceSample.image_url) \
+        .outerjoin(FaceSample, (FaceSample.user_id == User.id) & FaceSample.is_primary &
+                   (FaceSample.model_version == FACE_MODEL_VERSION)) \
+        .filter(User.image_url.isnot(None))
+    current = db.aliased(FaceSample)
+    extras = db.session.query(FaceSample.user_id, User.organization_id, FaceSample.image_url) \
+        .join(User, User.id == FaceSample.user_id) \
+        .filter(~FaceSample.is_primary, FaceSample.model_version != FACE_MODEL_VERSION,
+                FaceSample.image_url.isnot(None)) \
+        .filter(~db.session.query(current.id).filter(
+            current.user_id == FaceSample.user_id, current.image_url == FaceSample.image_url,
+            current.model_version == FACE_MODEL_VERSION).exists()) \
+        .distinct()
+    if organization_id is not None:
+        query = query.filter(User.organization_id == organization_id)
+        extras = extras.filter(User.organization_id == organization_id)
+
+    # keyed by (user, image url, primary)
+    tasks, orgs = [], {}
+    for uid, org_id, url, source in query.all():
+        if source != url:
+            tasks.append(((uid, url, True), _extract_filename(url)))
+            orgs[uid] = org_id
+    for uid, org_id, url in extras.all():
+        tasks.append(((uid, url, False), _extract_filename(url)))
+        orgs[uid] = org_id
+    if not tasks:
+        return 0
+
+    written, changed_users = 0, set()
+    for (uid, url, primary), encoding, error in get_encoding_pool().map(_encode_enrollment_image, tasks):
+        if error:
+            log.warning("Skipped %s of user %s: %s", url, uid, error)
+            continue
+        store_face_sample(uid, encoding, url, primary=primary)
+        changed_users.add(uid)
+        written += 1
+    for uid in changed_users:
+        refresh_representatives(uid)
+    db.session.commit()
+    for org_id in {orgs[uid] for uid in changed_users}:
+        get_gallery_store().publish(org_id, _gallery_from_db(org_id))
+    log.info("Backfilled %d of %d face encodings", written, len(tasks))
+    return written
+
+
+def load_known_faces(organization_id: int, force_reload: bool = False) -> Gallery:
+    """
+    Returns the Gallery for an org, memory-mapped from its current published
+    version. The first worker to need it (or a forced reload, or a version
+    older than CACHE_TTL) builds it from the stored encodings table and
+    publishes it for the others; workers arriving meanwhile wait on the
+    org's build lock and map that version instead of building their own.
     """
     now = time.time()
     cache = known_faces_cache.get(organization_id)
-    # If cache valid and not forcing, return immediately
-    if cache and not force_reload and now - cache['timestamp'] < CACHE_TTL:
+    # Checked recently and not forcing: return immediately
+    if cache and not force_reload and now - cache['checked'] < STORE_CHECK_INTERVAL:
+        GALLERY_CACHE_REQUESTS.labels("hit").inc()
         return cache['data']
 
-    # Query only id and url
-    rows = db.session.query(User.id, User.image_url) \
-        .filter_by(organization_id=organization_id) \
-        .filter(User.image_url.isnot(None)).all()
-
-    tasks = []
-    for uid, url in rows:
-        fname = _extract_filename(url)
-        tasks.append((uid, fname))
-
-    encs, ids = [], []
-    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
-        futures = pool.map(_process_user_face, tasks)
-        for uid, face_list in futures:
-            for e in face_list:
-                encs.append(e)
-                ids.append(uid)
-
-    # Cache and return
-    known_faces_cache[organization_id] = {'timestamp': now, 'data': (encs, ids)}
-    log.info("Loaded %d face encodings for org %s", len(encs), organization_id)
-    return encs, ids
+    store = get_gallery_store()
+
+    def usable(published):
+        # a forced reload accepts a version another worker built since it was asked for
+        if published is None:
+            return None
+        if force_reload:
+            return published if published.created_at >= now else None
+        return published if now - published.created_at < CACHE_TTL else None
+
+    published = None if force_reload else usable(store.current(organization_id))
+    if published is None:
+        with store.build_lock(organization_id):
+            # workers that waited here find the version the first one published
+            published = usable(store.current(organization_id))
+            if published is None:
+                with GALLERY_LOAD_SECONDS.labels("build").time():
+                    published = store.publish(organization_id, _gallery_from_db(organization_id))
+
+    if cache and cache['version'] == published.version:
+        # still current; keeps any local patches made since it was published
+        GALLERY_CACHE_REQUESTS.labels("hit").inc()
+        gallery = cache['data']
+    else:
+        GALLERY_CACHE_REQUESTS.labels("miss").inc()
+        with GALLERY_LOAD_SECONDS.labels("map").time():
+            gallery = store.load(organization_id, published)
+        log.info("Mapped %d representative encodings for org %s (version %s)",
+                 len(gallery), organization_id, published.version)
+
+    with _cache_lock:
+        known_faces_cache[organization_id] = {'checked': now, 'version': published.version, 'data': gallery}
+    return gallery
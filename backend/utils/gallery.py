@@ -0,0 +1,279 @@
+import logging
+from typing import NamedTuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+EMBEDDING_DIM = 128
+MATCH_THRESHOLD = 0.5
+# Storage format of face_encoding.encoding
+ENCODING_DTYPE = np.float64
+
+# Galleries smaller than this use exact search; an IVF scan only pays off
+# once the matrix no longer fits comfortably in cache.
+ANN_MIN_GALLERY_SIZE = 20_000
+# (min gallery size, nlist, nprobe): the last tier whose size <= n wins.
+# Tuned with `python -m benchmarks.ann_benchmark`.
+ANN_TIERS = [
+    (20_000, 128, 8),
+    (50_000, 256, 8),
+    (100_000, 512, 8),
+]
+# Per-user representatives: one centroid while a user's samples agree,
+# otherwise up to MAX_REPRESENTATIVES medoids (e.g. with and without glasses).
+MAX_REPRESENTATIVES = 3
+CENTROID_SPREAD = 0.35
+MEDOID_ITERS = 10
+KMEANS_ITERS = 10
+KMEANS_SAMPLES_PER_LIST = 64
+_CHUNK = 16384
+
+
+def encoding_to_bytes(encoding) -> bytes:
+    return np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes()
+
+
+def encoding_from_bytes(raw: bytes) -> np.ndarray:
+    return np.frombuffer(raw, dtype=ENCODING_DTYPE)
+
+
+def ann_params(n: int) -> tuple[int, int] | None:
+    """(nlist, nprobe) for a gallery of n vectors, or None for exact search."""
+    if n < ANN_MIN_GALLERY_SIZE:
+        return None
+    params = None
+    for min_size, nlist, nprobe in ANN_TIERS:
+        if n >= min_size:
+            params = (nlist, nprobe)
+    return params
+
+
+def _nearest_centroid(points: np.ndarray, centroids: np.ndarray, c_sq: np.ndarray) -> np.ndarray:
+    """Index of the nearest centroid for every point, computed in chunks."""
+    out = np.empty(len(points), dtype=np.int32)
+    for start in range(0, len(points), _CHUNK):
+        block = points[start:start + _CHUNK]
+        # |p|^2 is constant per row, so it does not change the argmin
+        out[start:start + _CHUNK] = np.argmin(c_sq[None, :] - 2.0 * (block @ centroids.T), axis=1)
+    return out
+
+
+def _kmeans(data: np.ndarray, nlist: int, iters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n_train = min(len(data), nlist * KMEANS_SAMPLES_PER_LIST)
+    sample = data[rng.choice(len(data), n_train, replace=False)]
+    centroids = sample[rng.choice(n_train, nlist, replace=False)].copy()
+    for _ in range(iters):
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        assign = _nearest_centroid(sample, centroids, c_sq)
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        nonempty = counts > 0
+        centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+    return centroids
+
+
+def representatives(samples) -> tuple[np.ndarray, list[int]]:
+    """
+    Compact a user's sample encodings into representative vectors. Returns
+    (vectors, source sample index per vector, -1 for a centroid).
+    """
+    x = np.asarray(samples, dtype=ENCODING_DTYPE).reshape(-1, EMBEDDING_DIM)
+    if len(x) <= 1:
+        return x, list(range(len(x)))
+    centroid = x.mean(axis=0)
+    if np.linalg.norm(x - centroid, axis=1).max() <= CENTROID_SPREAD:
+        return centroid[None, :], [-1]
+
+    d = np.linalg.norm(x[:, None, :] - x[None, :, :], axis=2)
+    # farthest-first seeding from the overall medoid, then k-medoids refinement
+    medoids = [int(np.argmin(d.sum(axis=1)))]
+    while len(medoids) < min(MAX_REPRESENTATIVES, len(x)):
+        gap = d[:, medoids].min(axis=1)
+        if gap.max() <= CENTROID_SPREAD:
+            break
+        medoids.append(int(np.argmax(gap)))
+    for _ in range(MEDOID_ITERS):
+        assign = np.argmin(d[:, medoids], axis=1)
+        updated = []
+        for c, m in enumerate(medoids):
+            members = np.flatnonzero(assign == c)
+            updated.append(int(members[np.argmin(d[np.ix_(members, members)].sum(axis=1))]) if len(members) else m)
+        if updated == medoids:
+            break
+        medoids = updated
+    return x[medoids], medoids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the `nprobe` closest buckets. It only
+    proposes candidates; Gallery re-ranks them with the exact distance.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray, nprobe: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.c_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.nlist = len(self.centroids)
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        # rows grouped by list: list i is order[offsets[i]:offsets[i + 1]]
+        self.order = np.argsort(self.assignments, kind='stable')
+        counts = np.bincount(self.assignments, minlength=self.nlist)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int, nprobe: int,
+              iters: int = KMEANS_ITERS, seed: int = 0) -> "IVFIndex":
+        nlist = max(1, min(nlist, len(matrix)))
+        centroids = _kmeans(matrix, nlist, iters, seed)
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        return cls(centroids, _nearest_centroid(matrix, centroids, c_sq), nprobe)
+
+    def reassigned(self, matrix: np.ndarray) -> "IVFIndex":
+        """Same centroids, lists rebuilt for a changed matrix (no re-training)."""
+        return IVFIndex(self.centroids, _nearest_centroid(matrix, self.centroids, self.c_sq), self.nprobe)
+
+    def candidates(self, queries: np.ndarray, nprobe: int | None = None) -> list[np.ndarray]:
+        """Row indices to re-rank for each query."""
+        nprobe = self.nprobe if nprobe is None else max(1, min(nprobe, self.nlist))
+        scores = self.c_sq[None, :] - 2.0 * (queries @ self.centroids.T)
+        if nprobe < self.nlist:
+            probes = np.argpartition(scores, nprobe - 1, axis=1)[:, :nprobe]
+        else:
+            probes = np.broadcast_to(np.arange(self.nlist), (len(queries), self.nlist))
+        return [
+            np.concatenate([self.order[self.offsets[p]:self.offsets[p + 1]] for p in row])
+            for row in probes
+        ]
+
+
+class FaceMatch(NamedTuple):
+    user_id: int | None       # best match under the threshold, else None
+    distance: float           # distance to the nearest gallery entry
+    top_k: list[tuple[int, float]]
+    slot: int | None = None   # which of the user's representatives matched
+
+
+class Gallery:
+    """
+    One org's known faces as a contiguous float32 matrix with precomputed
+    squared norms and aligned user id / representative slot arrays, so a
+    whole frame of faces is matched with a single matrix product. Large
+    galleries carry an IVFIndex that narrows the search before exact
+    re-ranking.
+    """
+
+    def __init__(self, matrix, ids, index: IVFIndex | None = None, slots=None, sq_norms=None):
+        # no copies for arrays that already have the right dtype and layout,
+        # so a gallery over memory-mapped files stays backed by shared pages
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.slots = np.zeros(len(self.ids), dtype=np.int16) if slots is None else np.asarray(slots, dtype=np.int16)
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix) if sq_norms is None \
+            else np.asarray(sq_norms, dtype=np.float32)
+        self.index = index
+
+    @classmethod
+    def build(cls, matrix, ids, slots=None):
+        """Gallery with an ANN index attached when the size calls for one."""
+        gallery = cls(matrix, ids, slots=slots)
+        params = ann_params(len(gallery))
+        if params:
+            nlist, nprobe = params
+            gallery.index = IVFIndex.build(gallery.matrix, nlist, nprobe)
+            log.info("Built IVF index (nlist=%d, nprobe=%d) over %d faces", nlist, nprobe, len(gallery))
+        return gallery
+
+    @classmethod
+    def from_rows(cls, rows) -> "Gallery":
+        """Build from (user_id, slot, encoding bytes) rows as stored in face_encoding."""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        matrix = np.vstack([encoding_from_bytes(raw) for _, _, raw in rows])
+        return cls.build(matrix, [uid for uid, _, _ in rows], [slot for _, slot, _ in rows])
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty((0, EMBEDDING_DIM), dtype=np.float32), [])
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Copy-on-write updates: readers holding the old Gallery are unaffected.
+    # An existing IVF index keeps its centroids and only re-buckets rows;
+    # crossing ANN_MIN_GALLERY_SIZE takes effect on the next full build.
+
+    def _derive(self, matrix, ids, slots) -> "Gallery":
+        index = self.index.reassigned(matrix) if self.index is not None and len(ids) else None
+        return Gallery(matrix, ids, index, slots)
+
+    def remove(self, user_id: int) -> "Gallery":
+        keep = self.ids != user_id
+        if keep.all():
+            return self
+        return self._derive(self.matrix[keep], self.ids[keep], self.slots[keep])
+
+    def add(self, user_id: int, encodings) -> "Gallery":
+        """Append a user's representatives; their slots are their positions in `encodings`."""
+        rows = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        if not len(rows):
+            return self
+        return self._derive(np.vstack([self.matrix, rows]),
+                            np.concatenate([self.ids, np.full(len(rows), user_id, dtype=np.int64)]),
+                            np.concatenate([self.slots, np.arange(len(rows), dtype=np.int16)]))
+
+    def replace(self, user_id: int, encodings) -> "Gallery":
+        return self.remove(user_id).add(user_id, encodings)
+
+    def distances(self, encodings, rows: np.ndarray | None = None) -> np.ndarray:
+        """Euclidean distances, shape (n_faces, n_gallery) or (n_faces, len(rows))."""
+        q = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        matrix, sq_norms = self.matrix, self.sq_norms
+        if rows is not None:
+            matrix, sq_norms = matrix[rows], sq_norms[rows]
+        q_sq = np.einsum('ij,ij->i', q, q)
+        d2 = q_sq[:, None] + sq_norms[None, :] - 2.0 * (q @ matrix.T)
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2)
+
+    def _rank(self, row: np.ndarray, cols: np.ndarray, k: int, threshold: float) -> FaceMatch:
+        k = min(k, len(row))
+        if k == 1:
+            top = np.array([np.argmin(row)])
+        else:
+            part = np.argpartition(row, k - 1)[:k]
+            top = part[np.argsort(row[part])]
+        best = float(row[top[0]])
+        matched = best < threshold
+        return FaceMatch(
+            int(self.ids[cols[top[0]]]) if matched else None,
+            best,
+            [(int(self.ids[cols[t]]), float(row[t])) for t in top],
+            int(self.slots[cols[top[0]]]) if matched else None,
+        )
+
+    def match(self, encodings, threshold: float = MATCH_THRESHOLD, k: int = 1,
+              exact: bool = False) -> list[FaceMatch]:
+        """Best match, its distance and the top-k (id, distance) for every face."""
+        n = len(encodings)
+        if n == 0:
+            return []
+        if len(self) == 0:
+            return [FaceMatch(None, float('inf'), []) for _ in range(n)]
+
+        if self.index is None or exact:
+            all_cols = np.arange(len(self))
+            return [self._rank(row, all_cols, k, threshold) for row in self.distances(encodings)]
+
+        q = np.asarray(encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+        results = []
+        for qi, cols in zip(q, self.index.candidates(q)):
+            if len(cols) < k:
+                cols = np.arange(len(self))
+            results.append(self._rank(self.distances(qi, cols)[0], cols, k, threshold))
+        return results
@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import atexit
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple
+
+import numpy as np
+
+from utils.gallery import Gallery, IVFIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are only serialized within a process
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+_store: "GalleryStore | None" = None
+_store_lock = threading.Lock()
+
+CURRENT = "CURRENT"
+LOCK = ".lock"
+# Old versions kept on disk besides the current one; workers that still map
+# them keep their pages even after the files are unlinked
+KEEP_VERSIONS = 2
+# Coalesce bursts of enrollments into one rebuild per org
+PUBLISH_DELAY = 2.0
+
+_ARRAYS = ("matrix", "ids", "slots", "sq_norms")
+
+
+class Published(NamedTuple):
+    version: str
+    created_at: float
+
+
+def _version_created(version: str) -> float:
+    return int(version.split("-", 1)[0]) / 1e9
+
+
+class GalleryStore:
+    """
+    Org galleries as versioned .npy files that every worker memory-maps
+    read-only, so all gunicorn workers share one copy of the pages.
+
+        <root>/org_<id>/<version>/{matrix,ids,slots,sq_norms}.npy
+        <root>/org_<id>/CURRENT          name of the live version
+
+    A version directory is complete before it is renamed into place, and
+    CURRENT is swapped with os.replace, so readers only ever see whole
+    versions. Versions are named by creation time, which doubles as their
+    age for the cache TTL.
+    """
+
+    def __init__(self, root: str, app=None, publish_delay: float = PUBLISH_DELAY):
+        self.root = root
+        self.app = app
+        self.publish_delay = publish_delay
+        self._timers: dict[int, tuple[threading.Timer, callable]] = {}
+        self._lock = threading.Lock()
+        self._build_locks: dict[int, threading.Lock] = {}
+
+    def _org_dir(self, organization_id: int) -> str:
+        return os.path.join(self.root, f"org_{organization_id}")
+
+    def current(self, organization_id: int) -> Published | None:
+        try:
+            with open(os.path.join(self._org_dir(organization_id), CURRENT)) as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return Published(version, _version_created(version)) if version else None
+
+    @contextmanager
+    def build_lock(self, organization_id: int):
+        """
+        Held while deciding whether to build an org's gallery and publishing
+        it: an exclusive flock on org_<id>/.lock across workers, plus a
+        per-org lock for threads of this one. Callers re-check current()
+        once they hold it, since another worker may have just published.
+        """
+        with self._lock:
+            local = self._build_locks.setdefault(organization_id, threading.Lock())
+        with local:
+            if fcntl is None:
+                yield
+                return
+            org_dir = self._org_dir(organization_id)
+            os.makedirs(org_dir, exist_ok=True)
+            with open(os.path.join(org_dir, LOCK), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, organization_id: int, gallery: Gallery) -> Published:
+        """Write a gallery as a new version and make it current."""
+        org_dir = self._org_dir(organization_id)
+        # created on first publish, so building the app never writes to disk
+        os.makedirs(org_dir, exist_ok=True)
+        version = f"{time.time_ns():020d}-{os.getpid()}"
+        tmp_dir = os.path.join(org_dir, f".tmp-{version}")
+        os.makedirs(tmp_dir)
+        for name in _ARRAYS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(gallery, name))
+        meta = {"count": len(gallery)}
+        if gallery.index is not None:
+            np.save(os.path.join(tmp_dir, "centroids.npy"), gallery.index.centroids)
+            np.save(os.path.join(tmp_dir, "assignments.npy"), gallery.index.assignments)
+            meta["nprobe"] = gallery.index.nprobe
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        os.rename(tmp_dir, os.path.join(org_dir, version))
+
+        pointer = os.path.join(org_dir, f".{CURRENT}-{version}")
+        with open(pointer, "w") as f:
+            f.write(version)
+        os.replace(pointer, os.path.join(org_dir, CURRENT))
+        self._prune(org_dir, version)
+        log.info("Published gallery %s for org %s (%d faces)", version, organization_id, len(gallery))
+        return Published(version, _version_created(version))
+
+    def load(self, organization_id: int, published: Published) -> Gallery:
+        """Gallery backed by read-only memory maps of a published version."""
+        path = os.path.join(self._org_dir(organization_id), published.version)
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = None
+        if "nprobe" in meta:
+            index = IVFIndex(np.load(os.path.join(path, "centroids.npy"), mmap_mode="r"),
+                             np.load(os.path.join(path, "assignments.npy"), mmap_mode="r"),
+                             meta["nprobe"])
+        return Gallery(arrays["matrix"], arrays["ids"], index, arrays["slots"], arrays["sq_norms"])
+
+    def _prune(self, org_dir: str, current: str):
+        versions = sorted(name for name in os.listdir(org_dir)
+                          if not name.startswith(".") and name != CURRENT and name != current)
+        for name in versions[:-KEEP_VERSIONS] if KEEP_VERSIONS else versions:
+            # on Windows a mapped file cannot be removed yet; a later publish retries
+            shutil.rmtree(os.path.join(org_dir, name), ignore_errors=True)
+
+    def schedule_publish(self, organization_id: int, build):
+        """
+        Rebuild (via `build()`, in an app context) and publish an org's
+        gallery after PUBLISH_DELAY, coalescing calls made in the meantime.
+        """
+        with self._lock:
+            if organization_id in self._timers:
+                return
+            timer = threading.Timer(self.publish_delay, self._publish_scheduled, (organization_id,))
+            timer.daemon = True
+            self._timers[organization_id] = (timer, build)
+        timer.start()
+
+    def _publish_scheduled(self, organization_id: int):
+        with self._lock:
+            _, build = self._timers.pop(organization_id, (None, None))
+        if build is None:
+            return
+        try:
+            with self.app.app_context(), self.build_lock(organization_id):
+                self.publish(organization_id, build())
+        except Exception:
+            log.exception("Failed to publish gallery for org %s", organization_id)
+
+    def shutdown(self):
+        """Publish pending rebuilds now instead of dropping them."""
+        with self._lock:
+            pending = list(self._timers.items())
+        for organization_id, (timer, _) in pending:
+            timer.cancel()
+            self._publish_scheduled(organization_id)
+
+
+def init_gallery_store(app):
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = GalleryStore(app.config["GALLERY_DIR"], app)
+            atexit.register(_store.shutdown)
+    return _store
+
+
+def get_gallery_store() -> GalleryStore:
+    if _store is None:
+        raise RuntimeError("Gallery store not initialised; call init_gallery_store(app)")
+    return _store
@@ -0,0 +1,106 @@
+import os
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from urllib.parse import urlparse
+
+import cv2
+from flask import abort, current_app, send_file
+from werkzeug.security import safe_join
+
+log = logging.getLogger(__name__)
+
+# Derivative name -> longest side in pixels
+IMAGE_VARIANTS = {
+    "avatar": 96,
+    "thumb": 320,
+}
+VARIANT_QUALITY = 85
+VARIANT_DIR = "_variants"
+# Uploads get unique names and are never rewritten, so clients may keep them for a year
+CACHE_MAX_AGE = 365 * 24 * 3600
+
+
+def _variant_path(upload_folder: str, filename: str, variant: str) -> str:
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(upload_folder, VARIANT_DIR, variant, f"{stem}.jpg")
+
+
+def _render_variant(src: str, dst: str, max_side: int) -> bool:
+    """Write a downscaled JPEG of src to dst atomically; False if src is not a readable image."""
+    img = cv2.imread(src, cv2.IMREAD_COLOR)
+    if img is None:
+        return False
+    scale = min(1.0, max_side / max(img.shape[:2]))
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), VARIANT_QUALITY])
+    if not ok:
+        return False
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    # concurrent first requests may both render; os.replace keeps the file whole
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(buf.tobytes())
+    os.replace(tmp, dst)
+    return True
+
+
+def make_variants(filename: str, upload_folder: str | None = None):
+    """Render every missing derivative of an upload (called once when it is saved)."""
+    upload_folder = upload_folder or current_app.config['UPLOAD_FOLDER']
+    src = os.path.join(upload_folder, filename)
+    for variant, max_side in IMAGE_VARIANTS.items():
+        dst = _variant_path(upload_folder, filename, variant)
+        if not os.path.isfile(dst) and not _render_variant(src, dst, max_side):
+            log.warning("Could not render %s variant of %s", variant, filename)
+            return
+
+
+@lru_cache(maxsize=4096)
+def _etag_for(path: str, mtime_ns: int, size: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:32]
+
+
+def content_etag(path: str) -> str:
+    """Content hash of a file, recomputed only when its mtime or size changes."""
+    st = os.stat(path)
+    return _etag_for(path, st.st_mtime_ns, st.st_size)
+
+
+def send_upload(filename: str, variant: str | None = None):
+    """
+    Serve an upload, or one of its IMAGE_VARIANTS (rendered on first use if
+    it predates them), with a content-hash ETag and long-lived caching.
+    Conditional requests get a 304.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(upload_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    if variant:
+        if variant not in IMAGE_VARIANTS:
+            abort(400, description=f"Unknown size {variant!r}.")
+        dst = _variant_path(upload_folder, filename, variant)
+        if os.path.isfile(dst) or _render_variant(path, dst, IMAGE_VARIANTS[variant]):
+            path = dst
+
+    response = send_file(path, etag=content_etag(path), max_age=CACHE_MAX_AGE, conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def variant_url(image_url: str | None, variant: str) -> str | None:
+    """URL of a derivative for one of our uploads; other URLs are returned unchanged."""
+    if not image_url:
+        return None
+    parsed = urlparse(image_url)
+    if "/upload/" not in parsed.path and "/uploads/" not in parsed.path:
+        return image_url
+    return f"{image_url}{'&' if parsed.query else '?'}size={variant}"
@@ -0,0 +1,270 @@
+import time
+import bisect
+import threading
+
+from flask import Response, g, request
+
+# Latency buckets (seconds) shared by every histogram here
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """The child series for these label values (created on first use)."""
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        """(suffix, label values, extra label, value) for every series."""
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", values, "", child.value
+
+
+class Gauge(_Metric):
+    """A gauge read from a callback at scrape time, so nothing is kept up to date in between."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read):
+        super().__init__(name, help)
+        self.read = read
+
+    def _samples(self):
+        yield "", (), "", self.read()
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+    def snapshot(self) -> tuple[list[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class _Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: _HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, seconds: float):
+        self.labels().observe(seconds)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield "_bucket", values, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", values, "", total
+            yield "_count", values, "", cumulative
+
+
+class Registry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Recording is a bisect plus a short per-series lock, cheap enough for
+    the frame loop. Under gunicorn every worker has its own registry and
+    a scrape is answered by whichever worker accepts it, so scrape each
+    worker (or run a single one) when exact totals matter.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, read) -> Gauge:
+        return self.register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _active_streams() -> dict:
+    from utils.stream_hub import stream_hub
+    return stream_hub.active()
+
+
+REGISTRY = Registry()
+
+RECOGNITION_STAGES = ("capture", "detect", "encode", "match", "draw", "jpeg", "db_write")
+RECOGNITION_STAGE_SECONDS = REGISTRY.histogram(
+    "recognition_stage_seconds",
+    "Time spent per recognition stage.",
+    ("stage",),
+)
+for _stage in RECOGNITION_STAGES:
+    # exported as zeros before the first stream, so rate() has a baseline
+    RECOGNITION_STAGE_SECONDS.labels(_stage)
+GALLERY_CACHE_REQUESTS = REGISTRY.counter(
+    "gallery_cache_requests_total",
+    "Gallery lookups answered from this worker's cache (hit) or mapped/built (miss).",
+    ("result",),
+)
+GALLERY_LOAD_SECONDS = REGISTRY.histogram(
+    "gallery_load_seconds",
+    "Time to map a published gallery or build and publish one from the database.",
+    ("source",),
+)
+REGISTRY.gauge("active_streams", "Recognition pipelines currently running.",
+               lambda: len(_active_streams()))
+REGISTRY.gauge("stream_viewers", "Clients watching a recognition stream.",
+               lambda: sum(h["viewers"] for h in _active_streams().values()))
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_seconds",
+    "Request latency until the response is returned (streams: until the first byte).",
+    ("blueprint", "method", "status"),
+)
+
+
+def stage_timer(stage: str) -> _Timer:
+    """Context manager recording one recognition stage."""
+    return RECOGNITION_STAGE_SECONDS.labels(stage).time()
+
+
+def _start_request_timer():
+    g._metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop("_metrics_started", None)
+    if started is not None:
+        HTTP_REQUEST_SECONDS.labels(request.blueprint or "app", request.method,
+                                    response.status_code).observe(time.perf_counter() - started)
+    return response
+
+
+def metrics_view():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+def init_metrics(app):
+    """Time every request by blueprint and expose the registry at /metrics."""
+    app.before_request(_start_request_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
+    return REGISTRY
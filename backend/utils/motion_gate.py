@@ -0,0 +1,55 @@
+import time
+
+import cv2
+import numpy as np
+
+THUMB_SIZE = (64, 48)
+# Grey-level change for a thumbnail pixel to count as moving
+PIXEL_DELTA = 20
+# Running-average background update rate
+BACKGROUND_ALPHA = 0.05
+
+
+class MotionGate:
+    """
+    Cheap pre-filter in front of face detection: compares a blurred 64x48
+    greyscale thumbnail with a running-average background and only lets a
+    frame through when enough of it changed. A detection is still forced
+    every `force_every` seconds in case someone stands perfectly still.
+    """
+
+    def __init__(self, min_fraction: float = 0.01, force_every: float = 5.0):
+        self.min_fraction = min_fraction
+        self.force_every = force_every
+        self._background: np.ndarray | None = None
+        self._last_pass = 0.0
+        self.frames = 0
+        self.skipped = 0
+
+    def motion_fraction(self, frame: np.ndarray) -> float:
+        thumb = cv2.cvtColor(cv2.resize(frame, THUMB_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        thumb = cv2.GaussianBlur(thumb, (5, 5), 0).astype(np.float32)
+        if self._background is None:
+            self._background = thumb
+            return 1.0
+        moving = np.count_nonzero(cv2.absdiff(thumb, self._background) > PIXEL_DELTA)
+        cv2.accumulateWeighted(thumb, self._background, BACKGROUND_ALPHA)
+        return moving / thumb.size
+
+    def should_detect(self, frame: np.ndarray, keep_open: bool = False, now: float | None = None) -> bool:
+        """
+        True if this frame should go to face detection. `keep_open` bypasses
+        the gate, e.g. while an unidentified face is still in view.
+        """
+        now = time.monotonic() if now is None else now
+        self.frames += 1
+        moved = self.motion_fraction(frame) >= self.min_fraction
+        if moved or keep_open or now - self._last_pass >= self.force_every:
+            self._last_pass = now
+            return True
+        self.skipped += 1
+        return False
+
+    @property
+    def skipped_fraction(self) -> float:
+        return self.skipped / self.frames if self.frames else 0.0
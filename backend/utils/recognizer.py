@@ -0,0 +1,128 @@
+import logging
+import time
+
+import cv2
+import numpy as np
+import face_recognition
+
+from utils.gallery import Gallery
+from utils.attendance_writer import get_attendance_writer
+from utils.face_tracker import FaceTracker
+from utils.stream_pipeline import Annotations
+from utils.detection_control import DetectionScaleController
+from utils.motion_gate import MotionGate
+from utils.metrics import RECOGNITION_STAGE_SECONDS, stage_timer
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DETECT_BUDGET_MS = 80
+
+
+class SessionRecognizer:
+    """
+    Detection, encoding, matching and attendance recording for one session.
+    Not thread-safe: each stream owns one and calls it from a single thread.
+    First sightings go to the write-behind AttendanceWriter, so no database
+    round-trip happens in the frame loop.
+    """
+
+    def __init__(self, session_id: int, gallery: Gallery, users: dict, existing: set,
+                 detection: DetectionScaleController | None = None,
+                 motion: MotionGate | None = None):
+        self.session_id = session_id
+        self.gallery = gallery
+        self.users = users
+        self.existing = existing
+        self.writer = get_attendance_writer()
+        self.tracker = FaceTracker()
+        self.detection = detection or DetectionScaleController(DEFAULT_DETECT_BUDGET_MS)
+        self.motion = motion or MotionGate()
+        self._last = Annotations()
+        self.encoded_faces = 0
+        self.skipped_faces = 0
+
+    def _identify(self, encodings) -> list[tuple[int | None, str]]:
+        """(user id or None, display name) per encoding; records first sightings."""
+        results = []
+        # all faces in the frame matched in one matrix op
+        with stage_timer("match"):
+            matches = self.gallery.match(encodings)
+        for match in matches:
+            uid = match.user_id
+            user = self.users.get(uid) if uid is not None else None
+            if not user:
+                results.append((None, "Unknown"))
+                continue
+            if uid not in self.existing:
+                self.writer.record(self.session_id, uid)
+                self.existing.add(uid)
+                log.info("Recorded %s in session %s (representative %s, distance %.3f)",
+                         uid, self.session_id, match.slot, match.distance)
+            results.append((uid, user.name))
+        return results
+
+    def identify(self, encodings) -> list[str]:
+        """Match encodings against the gallery, record first sightings, return display names."""
+        return [name for _, name in self._identify(encodings)]
+
+    def stats(self) -> dict:
+        return {
+            "detect_width": self.detection.width,
+            "detect_upsample": self.detection.upsample,
+            "detect_avg_ms": round(self.detection.avg_ms or 0.0, 1),
+            "motion_skipped_fraction": round(self.motion.skipped_fraction, 3),
+            "tracks": len(self.tracker.tracks),
+            "encoded_faces": self.encoded_faces,
+            "skipped_faces": self.skipped_faces,
+        }
+
+    def process(self, frame) -> Annotations:
+        """
+        Detect at the controller's current scale and update the tracker; only
+        new, unidentified or due-for-recheck tracks are encoded. Static frames
+        are stopped by the motion gate and keep the previous boxes. Returns
+        annotations at frame resolution.
+        """
+        now = time.monotonic()
+        unidentified = any(not tr.confirmed for tr in self.tracker.visible())
+        if not self.motion.should_detect(frame, keep_open=unidentified, now=now):
+            # nothing moved: hold the boxes where they are
+            self._last = Annotations(self._last.boxes, np.zeros_like(self._last.boxes), self._last.names, now)
+            return self._last
+
+        detect_size = self.detection.size_for(frame.shape)
+        small = cv2.resize(frame, detect_size)
+        rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        started = time.perf_counter()
+        locs = face_recognition.face_locations(rgb_small, number_of_times_to_upsample=self.detection.upsample)
+        elapsed = time.perf_counter() - started
+        RECOGNITION_STAGE_SECONDS.labels("detect").observe(elapsed)
+        self.detection.observe(elapsed * 1000, [bottom - top for (top, _, bottom, _) in locs])
+
+        # Scale locations to full frame
+        h_ratio = frame.shape[0] / detect_size[1]
+        w_ratio = frame.shape[1] / detect_size[0]
+        scaled_locs = [(
+            top * h_ratio,
+            right * w_ratio,
+            bottom * h_ratio,
+            left * w_ratio
+        ) for (top, right, bottom, left) in locs]
+
+        pending = [(track, i) for track, i in self.tracker.update(scaled_locs, now) if track.needs_encoding]
+        self.skipped_faces += len(locs) - len(pending)
+        if pending:
+            with stage_timer("encode"):
+                encs = face_recognition.face_encodings(rgb_small, [locs[i] for _, i in pending])
+            self.encoded_faces += len(encs)
+            for (track, _), (uid, name) in zip(pending, self._identify(encs)):
+                track.identify(uid, name)
+
+        tracks = self.tracker.visible()
+        self._last = Annotations(
+            [tr.box for tr in tracks],
+            [tr.velocity for tr in tracks],
+            [tr.name for tr in tracks],
+            now,
+        )
+        return self._last
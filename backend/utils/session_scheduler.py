@@ -0,0 +1,120 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+
+from config import db
+from models import AttendanceSession
+
+log = logging.getLogger(__name__)
+
+_scheduler: "SessionStatusScheduler | None" = None
+_scheduler_lock = threading.Lock()
+
+# Re-check at least this often, e.g. for sessions created by other processes (s)
+MAX_SLEEP = 60.0
+
+
+class SessionStatusScheduler:
+    """
+    Keeps AttendanceSession.status in step with the clock, so reads never
+    have to fix it up. A thread sleeps until the next start or end time,
+    then applies every due transition with bulk_update_statuses().
+    notify() wakes it early after a session is created or rescheduled.
+    Each app process runs one; the UPDATEs only match rows still in the
+    old status, so overlapping runs are harmless.
+    """
+
+    def __init__(self, app, max_sleep: float = MAX_SLEEP):
+        self.app = app
+        self.max_sleep = max_sleep
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self.transitions = 0
+        self.next_change: datetime | None = None
+
+    def start(self) -> "SessionStatusScheduler":
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="session-status", daemon=True)
+                    self._thread.start()
+        return self
+
+    def notify(self):
+        if self._thread is None:
+            self.start()
+        self._wake.set()
+
+    def run_once(self) -> float:
+        """Apply due transitions; returns seconds until the next one (capped at max_sleep)."""
+        with self.app.app_context():
+            try:
+                now = datetime.now(timezone.utc)
+                changed = AttendanceSession.bulk_update_statuses(now)
+                next_change = AttendanceSession.next_status_change(now)
+            except Exception:
+                db.session.rollback()
+                raise
+        if changed:
+            self.transitions += changed
+            log.info("Updated the status of %d sessions", changed)
+        if next_change is not None and next_change.tzinfo is None:
+            # SQLite hands back naive UTC
+            next_change = next_change.replace(tzinfo=timezone.utc)
+        self.next_change = next_change
+        if next_change is None:
+            return self.max_sleep
+        delay = (next_change - datetime.now(timezone.utc)).total_seconds()
+        return min(max(delay, 0.0), self.max_sleep)
+
+    def _run(self):
+        while not self._closed:
+            # cleared before the pass, so a notify() arriving during it
+            # (a session created mid-query) wakes the next wait at once
+            self._wake.clear()
+            try:
+                delay = self.run_once()
+            except Exception:
+                log.exception("Session status update failed")
+                delay = self.max_sleep
+            self._wake.wait(delay)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._thread is not None,
+            "transitions": self.transitions,
+            "next_change": self.next_change.isoformat() if self.next_change else None,
+        }
+
+    def shutdown(self):
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+def _start_with_first_request():
+    _scheduler.start()
+
+
+def init_session_scheduler(app):
+    """
+    Configure the process-wide scheduler. Its thread starts from
+    gunicorn.conf.py or with the first request, never in CLI commands.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SessionStatusScheduler(app)
+            atexit.register(_scheduler.shutdown)
+    app.before_request(_start_with_first_request)
+    return _scheduler
+
+
+def get_session_scheduler() -> SessionStatusScheduler:
+    if _scheduler is None:
+        raise RuntimeError("Session scheduler not initialised; call init_session_scheduler(app)")
+    return _scheduler
@@ -0,0 +1,94 @@
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class CameraBusy(Exception):
+    """The camera is already streaming recognition for another session."""
+
+
+class _Hub:
+    def __init__(self, session_id: int):
+        self.pipeline = None
+        self.session_id = session_id
+        self.viewers = 0
+        # set once the first subscriber's factory() returned or failed
+        self.ready = threading.Event()
+        self.error: BaseException | None = None
+
+    @property
+    def ended(self) -> bool:
+        return self.ready.is_set() and (self.pipeline is None or not self.pipeline.running)
+
+
+class StreamHub:
+    """
+    One capture + recognition pipeline per camera, shared by every viewer of
+    it. The first subscriber starts the pipeline, later ones just read its
+    output slot, and the pipeline stops when the last one disconnects.
+    Pipelines are built outside the hub lock, so a slow camera open only
+    holds up viewers of that camera.
+    """
+
+    def __init__(self):
+        self._hubs: dict[str, _Hub] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, camera_key: str, session_id: int, factory):
+        """
+        Subscribe to `camera_key`, calling factory() -> started StreamPipeline
+        if nothing is running there yet. Raises CameraBusy if the camera is
+        serving a different session, or factory()'s error if starting failed.
+        """
+        with self._lock:
+            hub = self._hubs.get(camera_key)
+            if hub and hub.ended:
+                # ended on its own (camera unplugged, end of file)
+                del self._hubs[camera_key]
+                hub = None
+            if hub and hub.session_id != session_id:
+                raise CameraBusy(f"Camera {camera_key} is streaming session {hub.session_id}")
+            starting = hub is None
+            if starting:
+                hub = self._hubs[camera_key] = _Hub(session_id)
+            hub.viewers += 1
+
+        if not starting:
+            hub.ready.wait()
+            if hub.error is not None:
+                raise hub.error
+            return hub.pipeline
+
+        try:
+            hub.pipeline = factory()
+        except BaseException as e:
+            hub.error = e
+            with self._lock:
+                if self._hubs.get(camera_key) is hub:
+                    del self._hubs[camera_key]
+            raise
+        finally:
+            hub.ready.set()
+        log.info("Started shared stream on camera %s for session %s", camera_key, session_id)
+        return hub.pipeline
+
+    def release(self, camera_key: str, pipeline):
+        with self._lock:
+            hub = self._hubs.get(camera_key)
+            if hub is None or hub.pipeline is not pipeline:
+                pipeline.stop()
+                return
+            hub.viewers -= 1
+            if hub.viewers > 0:
+                return
+            del self._hubs[camera_key]
+        log.info("Last viewer left camera %s", camera_key)
+        pipeline.stop()
+
+    def active(self) -> dict[str, dict]:
+        with self._lock:
+            return {k: {"session_id": h.session_id, "viewers": h.viewers} for k, h in self._hubs.items()}
+
+
+stream_hub = StreamHub()
@@ -0,0 +1,271 @@
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.metrics import stage_timer
+from utils.stream_quality import ViewerQuality
+
+log = logging.getLogger(__name__)
+
+# How long a stage waits for new input before re-checking for shutdown
+POLL_TIMEOUT = 1.0
+# Boxes are extrapolated along their velocity for at most this long
+MAX_EXTRAPOLATION = 0.5
+
+
+def draw_labels(frame: np.ndarray, locs: list, names: list[str]) -> np.ndarray:
+    """
+    Draw bounding boxes and names on the frame at its native resolution.
+    """
+    for (top, right, bottom, left), name in zip(locs, names):
+        color = (39, 123, 62) if name != "Unknown" else (89, 14, 195)
+        cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+        cv2.rectangle(frame, (left, top - 20), (right, top), color, cv2.FILLED)
+        cv2.putText(
+            frame,
+            name,
+            (left + 6, top - 6),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            0.5,
+            (255, 255, 255),
+            1
+        )
+    return frame
+
+
+class Annotations:
+    """
+    Boxes and names from one recognition round. Boxes carry a velocity
+    (px/s per edge) so the render stage can move them smoothly on frames
+    between detections.
+    """
+
+    def __init__(self, boxes=(), velocities=(), names=(), timestamp: float = 0.0):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.velocities = np.asarray(velocities, dtype=np.float64).reshape(-1, 4)
+        self.names = list(names)
+        self.timestamp = timestamp
+
+    def at(self, t: float) -> tuple[list, list[str]]:
+        """(locs, names) extrapolated to time t."""
+        if not self.names:
+            return [], []
+        dt = min(max(t - self.timestamp, 0.0), MAX_EXTRAPOLATION)
+        boxes = self.boxes + self.velocities * dt
+        return [tuple(int(v) for v in box) for box in boxes], self.names
+
+
+class RenderedFrame:
+    """
+    An annotated frame whose JPEG bytes are encoded on demand per
+    (quality, scale) and memoized, so viewers on the same output level
+    share a single encode.
+    """
+
+    def __init__(self, image: np.ndarray):
+        self.image = image
+        self._jpegs: dict[tuple[int, float], bytes] = {}
+        self._lock = threading.Lock()
+
+    def jpeg(self, quality: int, scale: float = 1.0) -> bytes | None:
+        key = (quality, scale)
+        with self._lock:
+            cached = self._jpegs.get(key)
+        if cached is not None:
+            return cached
+        img = self.image
+        if scale < 1.0:
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        with stage_timer("jpeg"):
+            ok, jpg = cv2.imencode('.jpg', img, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ok:
+            return None
+        with self._lock:
+            self._jpegs[key] = jpg.tobytes()
+            return self._jpegs[key]
+
+
+class LatestValue:
+    """
+    Bounded hand-off between stages with capacity one: put() overwrites
+    whatever the consumer has not taken yet, so a slow stage always sees
+    the newest item and stale frames are dropped rather than queued. Each
+    item gets a sequence number, which lets several consumers read the same
+    slot independently.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._closed = False
+        self.dropped = 0
+        self._taken_seq = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._seq > self._taken_seq:
+                self.dropped += 1
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after: int, timeout: float = POLL_TIMEOUT):
+        """
+        Newest (seq, item) with seq > after. Returns (after, None) on timeout
+        and None once the slot is closed.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._closed or self._seq > after, timeout)
+            if self._closed:
+                return None
+            if self._seq <= after:
+                return after, None
+            self._taken_seq = self._seq
+            return self._seq, self._item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StreamPipeline:
+    """
+    Runs an MJPEG recognition stream as three concurrent stages:
+
+      capture    cap.read() at camera rate            -> frames
+      recognize  newest frame, at most every `skip`th -> annotations
+      render     every frame + extrapolated boxes     -> rendered output
+
+    Viewers only pull finished frames from the output slot, so a slow
+    recognizer lowers the recognition rate, not the video frame rate. Any
+    number of viewers can read the same output (see StreamHub), each at its
+    own backpressure-driven JPEG level (see ViewerQuality); the owner calls
+    stop().
+    """
+
+    def __init__(self, app, cap, recognizer, skip: int = 3, quality: int = 50, name: str = "stream"):
+        self.app = app
+        self.cap = cap
+        self.recognizer = recognizer
+        self.skip = max(1, skip)
+        self.quality = quality
+        self.name = name
+
+        self.frames = LatestValue()
+        self.output = LatestValue()
+        self._annotations = Annotations()  # replaced atomically
+        self._stop = threading.Event()
+        self._stopped = False
+        self._stop_lock = threading.Lock()
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> "StreamPipeline":
+        for target in (self._capture, self._recognize, self._render):
+            t = threading.Thread(target=target, name=f"{self.name}-{target.__name__.strip('_')}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    @property
+    def running(self) -> bool:
+        return not self._stop.is_set()
+
+    def stop(self):
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._stop.set()
+        self.frames.close()
+        self.output.close()
+        for t in self._threads:
+            if t is not threading.current_thread():
+                t.join(timeout=5)
+        log.info("%s stopped (dropped %d captured / %d rendered frames; recognizer %s)",
+                 self.name, self.frames.dropped, self.output.dropped, self.recognizer.stats())
+
+    # Stages
+
+    def _capture(self):
+        try:
+            while not self._stop.is_set():
+                with stage_timer("capture"):
+                    ret, frame = self.cap.read()
+                if not ret:
+                    log.warning("%s: failed to grab frame, ending stream", self.name)
+                    break
+                self.frames.put(frame)
+        finally:
+            self.cap.release()
+            self._stop.set()
+            self.frames.close()
+
+    def _recognize(self):
+        seen = 0
+        with self.app.app_context():
+            while not self._stop.is_set():
+                got = self.frames.get(seen + self.skip - 1)
+                if got is None:
+                    break
+                seq, frame = got
+                if frame is None:
+                    continue
+                seen = seq
+                try:
+                    self._annotations = self.recognizer.process(frame)
+                except Exception:
+                    log.exception("%s: recognition failed", self.name)
+
+    def _render(self):
+        seen = 0
+        try:
+            while not self._stop.is_set():
+                got = self.frames.get(seen)
+                if got is None:
+                    break
+                seen, frame = got
+                if frame is None:
+                    continue
+                locs, names = self._annotations.at(time.monotonic())
+                with stage_timer("draw"):
+                    rendered = RenderedFrame(draw_labels(frame.copy(), locs, names))
+                # pre-encode the full-quality level most viewers sit at
+                rendered.jpeg(self.quality)
+                self.output.put(rendered)
+        finally:
+            self.output.close()
+
+    # Consumer
+
+    def jpeg_frames(self, viewer: ViewerQuality | None = None):
+        """
+        Yield JPEGs to one viewer until the stream ends. With a ViewerQuality,
+        the time each yield takes to drain steers that viewer's quality,
+        size and frame rate.
+        """
+        seen = 0
+        while True:
+            got = self.output.get(seen)
+            if got is None:
+                break
+            seen, rendered = got
+            if rendered is None:
+                continue
+            if viewer is None:
+                jpg = rendered.jpeg(self.quality)
+                if jpg is not None:
+                    yield jpg
+                continue
+            if not viewer.should_send():
+                continue
+            jpg = rendered.jpeg(viewer.quality, viewer.scale)
+            if jpg is None:
+                continue
+            started = time.perf_counter()
+            yield jpg
+            viewer.observe((time.perf_counter() - started) * 1000)
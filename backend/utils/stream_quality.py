@@ -0,0 +1,82 @@
+import logging
+
+log = logging.getLogger(__name__)
+
+QUALITY_STEP = 10
+OUTPUT_SCALES = (1.0, 0.75, 0.5, 0.35)
+EMA_ALPHA = 0.3
+# Frames between two level changes
+COOLDOWN = 10
+# Degrade when draining a frame takes this share of the frame interval,
+# improve again once it drops under the lower share.
+SLOW_SHARE = 0.8
+FAST_SHARE = 0.25
+
+
+def _ladder(max_quality: int, min_quality: int, min_scale: float, max_stride: int):
+    """(quality, scale, stride) from best to cheapest: quality first, then size, then rate."""
+    max_quality = max(min_quality, max_quality)
+    levels = [(q, 1.0, 1) for q in range(max_quality, min_quality - 1, -QUALITY_STEP)]
+    if levels[-1][0] != min_quality:
+        levels.append((min_quality, 1.0, 1))
+    scales = [s for s in OUTPUT_SCALES if min_scale <= s < 1.0]
+    levels += [(min_quality, s, 1) for s in scales]
+    last_scale = scales[-1] if scales else 1.0
+    levels += [(min_quality, last_scale, n) for n in range(2, max_stride + 1)]
+    return levels
+
+
+class ViewerQuality:
+    """
+    Per-viewer output settings driven by backpressure. The stream measures
+    how long each yielded frame takes to drain to the client; when that eats
+    most of the frame interval the viewer gets a lower JPEG quality, then a
+    smaller image, then every n-th frame, and the reverse once it keeps up.
+    Only this viewer's output changes; capture and recognition never wait
+    on it.
+    """
+
+    def __init__(self, max_quality: int, min_quality: int, min_scale: float,
+                 max_stride: int, target_fps: float, name: str = "viewer"):
+        self.levels = _ladder(max_quality, min_quality, min_scale, max_stride)
+        self.level = 0
+        self.interval_ms = 1000.0 / target_fps
+        self.name = name
+        self.avg_ms: float | None = None
+        self._since_change = 0
+        self._frame = 0
+
+    @property
+    def quality(self) -> int:
+        return self.levels[self.level][0]
+
+    @property
+    def scale(self) -> float:
+        return self.levels[self.level][1]
+
+    @property
+    def stride(self) -> int:
+        return self.levels[self.level][2]
+
+    def should_send(self) -> bool:
+        self._frame += 1
+        return self._frame % self.stride == 0
+
+    def observe(self, drain_ms: float):
+        self.avg_ms = drain_ms if self.avg_ms is None else \
+            EMA_ALPHA * drain_ms + (1 - EMA_ALPHA) * self.avg_ms
+        self._since_change += 1
+        if self._since_change < COOLDOWN:
+            return
+        # a strided viewer has `stride` intervals to drain each frame
+        budget = self.interval_ms * self.stride
+        if self.avg_ms > budget * SLOW_SHARE and self.level < len(self.levels) - 1:
+            self._set(self.level + 1)
+        elif self.avg_ms < budget * FAST_SHARE and self.level > 0:
+            self._set(self.level - 1)
+
+    def _set(self, level: int):
+        self.level = level
+        self._since_change = 0
+        log.info("%s: output quality=%d scale=%.2f every %d frame(s) (drain avg %.1fms)",
+                 self.name, self.quality, self.scale, self.stride, self.avg_ms)
@@ -0,0 +1,36 @@
+import os
+import uuid
+
+from flask import current_app, request
+from werkzeug.utils import secure_filename
+
+from utils.image_variants import make_variants
+
+
+def allowed_file(filename: str) -> bool:
+    allowed_exts = current_app.config['ALLOWED_EXTENSIONS']
+    return (
+        '.' in filename and
+        filename.rsplit('.', 1)[1].lower() in allowed_exts
+    )
+
+
+def save_upload(file) -> str:
+    """
+    Save an uploaded image under a unique name, render its avatar/thumbnail
+    derivatives, and return its public URL.
+    Raises ValueError with a client-facing message for unusable files.
+    """
+    if file.filename == '':
+        raise ValueError("No selected file.")
+    if not allowed_file(file.filename):
+        raise ValueError("Unsupported file type.")
+
+    # create a unique, safe filename
+    ext = file.filename.rsplit('.', 1)[1].lower()
+    filename = secure_filename(f"{uuid.uuid4().hex}.{ext}")
+    file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+    make_variants(filename)
+
+    # build the public URL
+    return f"{request.url_root.rstrip('/')}/upload/{filename}"
@@ -0,0 +1,192 @@
+import os
+import time
+import logging
+import platform
+
+import cv2
+
+log = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+# Used to pace image directories, and files that do not report their FPS
+DEFAULT_REPLAY_FPS = 15.0
+
+PACE_REALTIME = "realtime"
+PACE_MAX = "max"
+
+
+class CaptureSource:
+    """cv2.VideoCapture behind the read()/release()/isOpened() interface the pipeline uses."""
+
+    def __init__(self, target, api_preference: int = cv2.CAP_ANY):
+        self.cap = cv2.VideoCapture(target, api_preference)
+        self.is_live = isinstance(target, int) or _is_network(str(target))
+
+    @property
+    def fps(self) -> float:
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        return fps if fps and fps > 0 else DEFAULT_REPLAY_FPS
+
+    def isOpened(self) -> bool:
+        return self.cap.isOpened()
+
+    def read(self):
+        return self.cap.read()
+
+    def rewind(self) -> bool:
+        return not self.is_live and self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource:
+    """Images in a directory, in name order, as if they were frames."""
+
+    is_live = False
+
+    def __init__(self, path: str, fps: float = DEFAULT_REPLAY_FPS):
+        self.paths = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+        self.fps = fps
+        self._pos = 0
+
+    def isOpened(self) -> bool:
+        return bool(self.paths)
+
+    def read(self):
+        while self._pos < len(self.paths):
+            frame = cv2.imread(self.paths[self._pos])
+            self._pos += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def rewind(self) -> bool:
+        self._pos = 0
+        return True
+
+    def release(self):
+        self._pos = len(self.paths)
+
+
+class ReplaySource:
+    """
+    Wraps a recorded source: paces reads to its original FPS (or not at all
+    with pace="max", for throughput tests) and optionally loops forever.
+    """
+
+    def __init__(self, source, pace: str = PACE_REALTIME, loop: bool = False):
+        self.source = source
+        self.pace = pace
+        self.loop = loop
+        self.fps = source.fps
+        self.is_live = False
+        self._start: float | None = None
+        self._frames = 0
+
+    def isOpened(self) -> bool:
+        return self.source.isOpened()
+
+    def read(self):
+        ok, frame = self.source.read()
+        if not ok and self.loop and self.source.rewind():
+            ok, frame = self.source.read()
+        if not ok:
+            return ok, frame
+        if self.pace == PACE_REALTIME:
+            now = time.monotonic()
+            if self._start is None:
+                self._start = now
+            due = self._start + self._frames / self.fps
+            if due > now:
+                time.sleep(due - now)
+        self._frames += 1
+        return ok, frame
+
+    def release(self):
+        self.source.release()
+
+
+def open_video_source(spec, pace: str = PACE_REALTIME, loop: bool = False):
+    """
+    Open a frame source from a spec string:
+
+      "0", "device:0"          local camera index (DirectShow on Windows)
+      "rtsp://...", "http://"  network stream
+      "file:/path", "/path"    video file, replayed
+      "dir:/path", "/path/"    directory of images, replayed
+
+    Recorded sources (files, directories) are wrapped in ReplaySource.
+    """
+    spec = str(spec).strip()
+    if spec.startswith("device:"):
+        spec = spec[len("device:"):]
+    if spec.isdigit():
+        api = cv2.CAP_DSHOW if platform.system() == "Windows" else cv2.CAP_ANY
+        return CaptureSource(int(spec), api)
+    if _is_network(spec):
+        return CaptureSource(spec, cv2.CAP_FFMPEG)
+
+    if spec.startswith("dir:"):
+        source = ImageDirectorySource(spec[len("dir:"):])
+    elif spec.startswith("file:"):
+        source = CaptureSource(spec[len("file:"):])
+    elif os.path.isdir(spec):
+        source = ImageDirectorySource(spec)
+    else:
+        source = CaptureSource(spec)
+    log.info("Replaying %s at %s (%.1f fps, loop=%s)", spec, pace, source.fps, loop)
+    return ReplaySource(source, pace=pace, loop=loop)
+
+
+NETWORK_SCHEMES = ("rtsp://", "http://", "https://")
+
+
+def _is_network(spec: str) -> bool:
+    return spec.strip().lower().startswith(NETWORK_SCHEMES)
+
+
+def _is_recorded(spec: str) -> bool:
+    spec = spec.strip()
+    if spec.startswith("device:") or spec.isdigit():
+        return False
+    return not _is_network(spec)
+
+
+def resolve_source(spec, replay_dir: str, cameras: dict[str, str] | None = None) -> str:
+    """
+    Validate a source spec taken from a request. A name from `cameras`
+    (VIDEO_CAMERAS) is replaced by its configured spec; devices come back
+    as "device:<index>"; network streams must be configured cameras, so
+    requests cannot point the server at arbitrary URLs; recorded files and
+    directories are resolved relative to replay_dir and must stay inside
+    it. Raises ValueError otherwise. Equivalent specs resolve to the same
+    string, so the result can key shared streams.
+    """
+    cameras = cameras or {}
+    spec = str(spec).strip()
+    if not spec:
+        raise ValueError("Empty video source.")
+    configured = spec in cameras or spec in cameras.values()
+    spec = cameras.get(spec, spec)
+    if _is_network(spec):
+        if not configured:
+            raise ValueError("Network sources must be configured in VIDEO_CAMERAS.")
+        return spec
+    if not _is_recorded(spec):
+        index = spec[len("device:"):] if spec.startswith("device:") else spec
+        if not index.isdigit():
+            raise ValueError(f"Unknown camera {spec!r}.")
+        return f"device:{int(index)}"
+    prefix = ""
+    for p in ("dir:", "file:"):
+        if spec.startswith(p):
+            prefix, spec = p, spec[len(p):]
+    root = os.path.realpath(replay_dir)
+    path = os.path.realpath(os.path.join(root, spec))
+    if os.path.commonpath([root, path]) != root or not os.path.exists(path):
+        raise ValueError(f"Unknown replay source {spec!r}.")
+    return prefix + path